@@ -10,6 +10,7 @@ from okx import Account, Trade, Funding, MarketData, PublicData
 
 from backpack_exchange.trade_prepare import (proxy_on, load_okx_api_keys_trade_cat_okx,
                                              load_backpack_api_keys_trade_cat_funding)
+from utils.latency import metrics, serve_metrics
 from utils.logging_setup import setup_logger
 
 # === 初始化设置 ===
@@ -58,6 +59,7 @@ THRESHOLD_DIFF_Y = 0.07  # 资金费率差套利阈值年化（10%）
 MAX_ORDER_USD = 1000  # 每次套利的最大 USD 头寸
 MAX_LEVERAGE = 10  # 最大杠杆倍数
 SETTLEMENT_WINDOW_MIN = 30  # 资金费率结算前几分钟内允许操作
+METRICS_PORT = 9110  # 本地延迟指标接口端口（REST 请求、下单耗时），None 表示不启动
 logger = setup_logger(__name__)
 
 
@@ -145,8 +147,10 @@ def calculate_funding_rate_diff():
     results = []
     for okx_symbol, backpack_symbol in SYMBOL_MAP.items():
         try:
-            okx_rate, okx_funding_time, _ = get_okx_funding_rate(okx_public_api, okx_symbol)
-            backpack_rate, backpack_funding_time = get_backpack_funding_rate(backpack_public, backpack_symbol)
+            with metrics.timed(okx_symbol, "okx_funding_rate"):
+                okx_rate, okx_funding_time, _ = get_okx_funding_rate(okx_public_api, okx_symbol)
+            with metrics.timed(backpack_symbol, "backpack_funding_rate"):
+                backpack_rate, backpack_funding_time = get_backpack_funding_rate(backpack_public, backpack_symbol)
             diff = okx_rate - backpack_rate
             # 资金费率通常8小时结算一次，年化=单次费率*3*365
             annualized = abs(diff) * 3 * 365
@@ -459,8 +463,9 @@ def arbitrage_loop():
                             backpack_result = {}
                             for okx_attempt in range(3):
                                 try:
-                                    okx_result = execute_okx_order_swap(r["okx_symbol"], r["okx_action"], okx_qty,
-                                                                        price)
+                                    with metrics.timed(r["okx_symbol"], "okx_order"):
+                                        okx_result = execute_okx_order_swap(r["okx_symbol"], r["okx_action"],
+                                                                            okx_qty, price)
                                     break
                                 except Exception as okx_e:
                                     logger.info(f"[异常] OKX下单失败, 第{okx_attempt + 1}次重试: {okx_e}")
@@ -473,9 +478,10 @@ def arbitrage_loop():
                                     if ((bp_attempt == 0 and
                                          check_okx_order_filled(r["okx_symbol"], okx_result["data"][0].get("ordId")))
                                             or bp_attempt > 0):
-                                        backpack_result = execute_backpack_order(r["backpack_symbol"],
-                                                                                 r["backpack_action"], backpack_qty,
-                                                                                 price)
+                                        with metrics.timed(r["backpack_symbol"], "backpack_order"):
+                                            backpack_result = execute_backpack_order(r["backpack_symbol"],
+                                                                                     r["backpack_action"],
+                                                                                     backpack_qty, price)
                                     break
                                 except Exception as bp_e:
                                     logger.info(f"[异常] Backpack下单失败, 第{bp_attempt + 1}次重试: {bp_e}")
@@ -596,4 +602,6 @@ def arbitrage_loop():
 
 
 if __name__ == "__main__":
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
     arbitrage_loop()
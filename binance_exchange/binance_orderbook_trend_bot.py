@@ -3,107 +3,226 @@ import aiohttp
 import websockets
 import json
 import time
-from collections import deque, defaultdict
-from statistics import mean
+from bisect import bisect_left, insort
+from collections import deque
+
+from utils.latency import metrics, serve_metrics
 
 # ========== 可调参数 ==========
-SYMBOL = "ETHUSDT"  # 币对（Binance U 合约写大写，例如 BTCUSDT / ETHUSDT / SOLUSDT）
-DEPTH_LIMIT = 100  # REST 快照深度（5/10/20/50/100）
+SYMBOLS = ["ETHUSDT"]  # 币对列表（Binance U 合约写大写，例如 BTCUSDT / ETHUSDT / SOLUSDT）
+# 行情模式：
+#   diff    —— depth@100ms 全量增量 + REST 快照同步，维护完整订单簿（默认）
+#   partial —— bookTicker 实时最优价 + depth{N} 前 N 档部分快照算 OBI，无需快照同步
+#   ticker  —— 仅 bookTicker，OBI 退化为最优一档挂单量失衡；流量与 CPU 最低
+# partial / ticker 用 aggTrade 代替 trade，且中价均线按 bookTicker 更新（tick 更密，可改用 MID_SMA_SEC）
+FEED_MODE = "diff"
+PARTIAL_DEPTH_LEVELS = 20  # partial 模式的部分快照档数（5/10/20），应不小于 TOP_N
+PARTIAL_DEPTH_SPEED = "100ms"  # partial 模式的部分快照推送间隔（100ms/250ms/500ms）
+DEPTH_LIMIT = 100  # REST 快照深度（5/10/20/50/100/500/1000）
 TOP_N = 10  # 计算 OBI 的前 N 档
-TFI_WINDOW_SEC = 3  # 计算 TFI 的时间窗口（秒）
-MID_SMA_LEN = 10  # 中价短均线长度（tick 数）
+TFI_WINDOW_SEC = 3  # 计算 TFI 的时间窗口（秒），None 表示只按条数
+TFI_WINDOW_TRADES = None  # TFI 最多统计的最近成交笔数，None 表示只按时间
+TFI_VOLUME_WEIGHTED = False  # True 时按成交量加权：主动买成交量 / 总成交量
+MID_SMA_LEN = 10  # 中价短均线长度（tick 数），None 表示只按时间
+MID_SMA_SEC = None  # 中价短均线时间窗口（秒），None 表示只按条数
+RECOMPUTE_EVERY = 10_000  # 滑动求和每写入该条数后从头重算一次，消除浮点累计误差
 OBI_LONG_TH = 0.20  # 多头 OBI 阈值
 OBI_SHORT_TH = -0.20  # 空头 OBI 阈值
 TFI_LONG_TH = 0.60  # 多头 TFI 阈值（>0.5 偏多）
 TFI_SHORT_TH = 0.40  # 空头 TFI 阈值（<0.5 偏空）
 MIN_SIGNAL_INTERVAL = 2.0  # 两次信号最小间隔（秒）去抖
 PRINT_EVERY = 1.0  # 控制台打印间隔（秒）
+PENDING_DELTA_MAX = 1000  # 等待快照期间最多缓存的增量条数
+STALE_SIGNAL_MS = 1000  # 最新事件的交易所时间到决策超过该时长即标记为过期信号（毫秒）
+METRICS_PORT = 9109  # 本地延迟指标接口端口，None 表示不启动
+MAX_STREAMS_PER_CONN = 200  # 单条组合流连接的订阅上限（U 本位合约为 200），超出时拆分到多条连接
+SNAPSHOT_CONCURRENCY = 4  # 同时进行的 REST 快照请求数上限
+QUEUE_MAXSIZE = 2000  # 收包与处理之间的队列上限（条），满时收包协程等待，depth 增量尽量合并
+WS_MAX_QUEUE = 256  # websockets 库内部接收缓冲（帧），有界以便向对端施加背压
 
 # ========== 端点（Binance U 永续） ==========
 REST_DEPTH = "https://fapi.binance.com/fapi/v1/depth"
 WS_STREAM = "wss://fstream.binance.com/stream?streams={streams}"
 # depth 增量（100ms）： {symbol}@depth@100ms
 # 逐笔成交：             {symbol}@trade
-DEPTH_STREAM = f"{SYMBOL.lower()}@depth@100ms"
-TRADE_STREAM = f"{SYMBOL.lower()}@trade"
+# 最优挂单：             {symbol}@bookTicker
+# 前 N 档部分快照：       {symbol}@depth{N}@{speed}
+# 归集成交：             {symbol}@aggTrade
+
+FEED_DIFF = "diff"
+FEED_PARTIAL = "partial"
+FEED_TICKER = "ticker"
 
 
 # ========== 订单簿数据结构 ==========
+class PriceLevels:
+    """
+    单边价位簿：有序价格键数组 + 价格->数量字典
+    - 键按"优先级"升序排列，最优价始终位于下标 0：卖盘键为价格本身，买盘键为价格取负
+    - 最优价 O(1)，前 N 档 O(N)，单档更新 O(log n) 定位（1000 档快照下插入/删除的内存移动可忽略）
+    """
+
+    def __init__(self, is_bid):
+        self.is_bid = is_bid
+        self.keys = []  # 有序键
+        self.levels = {}  # 键 -> 数量
+
+    def clear(self):
+        self.keys.clear()
+        self.levels.clear()
+
+    def load(self, levels):
+        """整体替换为快照 [(价格, 数量), ...]，一次排序建立有序键"""
+        sign = -1.0 if self.is_bid else 1.0
+        self.levels = {sign * float(p): float(s) for p, s in levels if float(s) != 0.0}
+        self.keys = sorted(self.levels)
+
+    def set(self, price, size):
+        """更新单个价位，数量为 0 时删除"""
+        key = -price if self.is_bid else price
+        if size == 0.0:
+            if self.levels.pop(key, None) is not None:
+                del self.keys[bisect_left(self.keys, key)]
+        else:
+            if key not in self.levels:
+                insort(self.keys, key)
+            self.levels[key] = size
+
+    def best(self):
+        return abs(self.keys[0]) if self.keys else None
+
+    def top(self, n):
+        """前 n 档 [(价格, 数量), ...]，买盘从高到低，卖盘从低到高"""
+        levels = self.levels
+        return [(abs(k), levels[k]) for k in self.keys[:n]]
+
+    def volume(self, n):
+        """前 n 档数量合计"""
+        levels = self.levels
+        return sum(levels[k] for k in self.keys[:n])
+
+    def __len__(self):
+        return len(self.keys)
+
+
 class OrderBook:
     """
-    维护一个可增量更新的订单簿（Binance depth stream）
-    - bids/asks: dict[price] = size
-    - 使用 last_update_id + u/U/pu 来确保顺序正确（按官方建议）
+    维护一个可增量更新的订单簿（Binance depth stream），按官方流程做快照/增量同步
+    - bids/asks: PriceLevels 有序价位簿
+    - 状态机：WAIT_SNAPSHOT（缓存增量，等待 REST 快照）-> ALIGNING（丢弃 u < lastUpdateId 的旧增量，
+      以首个满足 U <= lastUpdateId+1 且 u >= lastUpdateId 的增量对齐）-> LIVE（逐条校验 pu == 上一条 u）
+    - 只有真正出现缺口才需要重新拉快照，resync_count 记录次数
     """
 
+    WAIT_SNAPSHOT = "wait_snapshot"
+    ALIGNING = "aligning"
+    LIVE = "live"
+
+    # apply_delta 返回值
+    APPLIED = "applied"
+    BUFFERED = "buffered"
+    DROPPED = "dropped"
+    GAP = "gap"
+
     def __init__(self):
-        self.bids = defaultdict(float)  # price -> size
-        self.asks = defaultdict(float)
+        self.bids = PriceLevels(is_bid=True)
+        self.asks = PriceLevels(is_bid=False)
         self.last_update_id = None
-        self.ready = False
+        self.state = self.WAIT_SNAPSHOT
+        self.pending = deque(maxlen=PENDING_DELTA_MAX)  # 等待快照期间缓存的增量
+        self.resync_count = 0
+
+    @property
+    def ready(self):
+        return self.state == self.LIVE
+
+    def reset(self):
+        """作废当前订单簿，回到等待快照状态（如连接重建）"""
+        self.state = self.WAIT_SNAPSHOT
+        self.pending.clear()
+
+    def resync(self):
+        """序列出现缺口，作废订单簿并计数，调用方随后重新拉取快照"""
+        self.reset()
+        self.resync_count += 1
 
     def load_snapshot(self, snapshot):
-        self.bids.clear()
-        self.asks.clear()
-        for p, s in snapshot["bids"]:
-            self.bids[float(p)] = float(s)
-        for p, s in snapshot["asks"]:
-            self.asks[float(p)] = float(s)
+        """
+        载入 REST 快照并回放等待期间缓存的增量
+        :return: False 表示缓存的增量已晚于快照（快照过旧）或中途出现缺口，需要重新拉取快照
+        """
+        self.bids.load(snapshot["bids"])
+        self.asks.load(snapshot["asks"])
         self.last_update_id = snapshot["lastUpdateId"]
-        self.ready = True
-
-    def _apply_side(self, side_dict, updates):
-        for p_str, s_str in updates:
-            p = float(p_str)
-            s = float(s_str)
-            if s == 0.0:
-                side_dict.pop(p, None)
-            else:
-                side_dict[p] = s
+        self.state = self.ALIGNING
+        pending = list(self.pending)
+        self.pending.clear()
+        for delta in pending:
+            if self._process(delta) == self.GAP:
+                return False
+        return True
 
-    def apply_delta(self, delta):
+    def load_partial(self, payload):
         """
-        delta: {'e':'depthUpdate','E':..., 's':..., 'U': firstUpdateId, 'u': finalUpdateId, 'pu': prevFinalUpdateId, 'b': bids, 'a': asks}
-        需要确保与 REST snapshot 对齐（pu == last_update_id）
+        partial 模式：前 N 档部分快照整体替换订单簿，无需与增量对齐
+        payload: {'e':'depthUpdate', 'u': ..., 'b': [...], 'a': [...]}
         """
-        if not self.ready:
-            return False
+        self.bids.load(payload.get("b", []))
+        self.asks.load(payload.get("a", []))
+        self.last_update_id = payload.get("u")
+        self.state = self.LIVE
+
+    def _apply_side(self, side, updates):
+        for p_str, s_str in updates:
+            side.set(float(p_str), float(s_str))
 
+    def _process(self, delta):
         U = delta.get("U")
         u = delta.get("u")
-        pu = delta.get("pu")
-
-        # 首包校验：pu 必须等于我们本地的 last_update_id
-        if self.last_update_id is None:
-            return False
-        if pu is not None and pu != self.last_update_id:
-            # 序列不同步，需要重新拉 snapshot
-            return False
-
-        # 应用增量
+        if self.state == self.ALIGNING:
+            if u < self.last_update_id:
+                # 快照已包含该增量
+                return self.DROPPED
+            if U > self.last_update_id + 1:
+                # 快照早于增量流，中间缺失
+                return self.GAP
+        else:
+            pu = delta.get("pu")
+            expected = pu == self.last_update_id if pu is not None else U == self.last_update_id + 1
+            if not expected:
+                return self.GAP
         self._apply_side(self.bids, delta["b"])
         self._apply_side(self.asks, delta["a"])
         self.last_update_id = u
-        return True
+        self.state = self.LIVE
+        return self.APPLIED
+
+    def apply_delta(self, delta):
+        """
+        delta: {'e':'depthUpdate','E':..., 's':..., 'U': firstUpdateId, 'u': finalUpdateId, 'pu': prevFinalUpdateId, 'b': bids, 'a': asks}
+        :return: APPLIED 已应用 / BUFFERED 等待快照中已缓存 / DROPPED 早于快照已丢弃 / GAP 出现缺口需 resync
+        """
+        if self.state == self.WAIT_SNAPSHOT:
+            self.pending.append(delta)
+            return self.BUFFERED
+        return self._process(delta)
 
     def top_n_imbalance(self, n=10):
         if not self.bids or not self.asks:
             return 0.0
 
-        top_bids = sorted(self.bids.items(), key=lambda x: x[0], reverse=True)[:n]
-        top_asks = sorted(self.asks.items(), key=lambda x: x[0])[:n]
-        bid_vol = sum(s for _, s in top_bids)
-        ask_vol = sum(s for _, s in top_asks)
+        bid_vol = self.bids.volume(n)
+        ask_vol = self.asks.volume(n)
         total = bid_vol + ask_vol
         if total <= 0:
             return 0.0
         return (bid_vol - ask_vol) / total
 
     def best_bid(self):
-        return max(self.bids.keys()) if self.bids else None
+        return self.bids.best()
 
     def best_ask(self):
-        return min(self.asks.keys()) if self.asks else None
+        return self.asks.best()
 
     def mid_price(self):
         bb = self.best_bid()
@@ -113,35 +232,167 @@ class OrderBook:
         return 0.5 * (bb + ba)
 
 
+class BookTicker:
+    """
+    bookTicker 推送的最优买卖价及挂单量
+    payload: {'e':'bookTicker', 'u': ..., 'E': ..., 'T': ..., 's': ..., 'b': 买一价, 'B': 买一量, 'a': 卖一价, 'A': 卖一量}
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.bid = self.bid_qty = self.ask = self.ask_qty = None
+        self.update_id = None
+
+    @property
+    def ready(self):
+        return self.bid is not None
+
+    def update(self, payload):
+        """按 u 丢弃乱序的旧推送；返回是否已更新"""
+        u = payload.get("u")
+        if self.update_id is not None and u is not None and u <= self.update_id:
+            return False
+        self.update_id = u
+        self.bid = float(payload["b"])
+        self.bid_qty = float(payload["B"])
+        self.ask = float(payload["a"])
+        self.ask_qty = float(payload["A"])
+        return True
+
+    def mid_price(self):
+        return 0.5 * (self.bid + self.ask) if self.ready else None
+
+    def imbalance(self):
+        """最优一档挂单量失衡"""
+        total = (self.bid_qty or 0.0) + (self.ask_qty or 0.0)
+        if total <= 0:
+            return 0.0
+        return (self.bid_qty - self.ask_qty) / total
+
+
+# ========== 滑动窗口 ==========
+class RollingSum:
+    """
+    按时间和/或条数限定的滑动窗口，维护各列的累计和，写入均摊 O(1)、读取 O(1)
+    - window_ms：只保留时间戳不早于 最新时间 - window_ms 的样本
+    - maxlen：只保留最近 maxlen 条样本
+    - 浮点列增删会累积舍入误差，每写入 recompute_every 条按窗口内样本从头重算
+    """
+
+    def __init__(self, width, window_ms=None, maxlen=None, recompute_every=RECOMPUTE_EVERY):
+        """
+        :param width: 每条样本的列数
+        :param window_ms: 时间窗口（毫秒），None 表示不按时间淘汰
+        :param maxlen: 条数上限，None 表示不按条数淘汰
+        """
+        if window_ms is None and maxlen is None:
+            raise ValueError("window_ms 与 maxlen 至少指定一个")
+        self.width = width
+        self.window_ms = window_ms
+        self.maxlen = maxlen
+        self.recompute_every = recompute_every
+        self.buffer = deque()  # (ts_ms, 各列取值)
+        self.sums = [0.0] * width
+        self.filled = False  # 窗口是否曾经填满（条数达到上限或已有样本按时间滑出）
+        self._since_recompute = 0
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def _pop(self):
+        _, values = self.buffer.popleft()
+        sums = self.sums
+        for i, v in enumerate(values):
+            sums[i] -= v
+        self.filled = True
+
+    def expire(self, now_ms):
+        """淘汰早于 now_ms - window_ms 的样本"""
+        if self.window_ms is None:
+            return
+        cutoff = now_ms - self.window_ms
+        buffer = self.buffer
+        while buffer and buffer[0][0] < cutoff:
+            self._pop()
+        if not buffer:
+            self.sums = [0.0] * self.width
+
+    def add(self, ts_ms, values):
+        """写入一条样本，values 为长度 width 的元组"""
+        self.buffer.append((ts_ms, values))
+        sums = self.sums
+        for i, v in enumerate(values):
+            sums[i] += v
+        if self.maxlen is not None:
+            while len(self.buffer) > self.maxlen:
+                self._pop()
+            if len(self.buffer) == self.maxlen:
+                self.filled = True
+        self.expire(ts_ms)
+        self._since_recompute += 1
+        if self._since_recompute >= self.recompute_every:
+            self.recompute()
+
+    def recompute(self):
+        """按窗口内样本重算累计和"""
+        self._since_recompute = 0
+        self.sums = [sum(col) for col in zip(*(values for _, values in self.buffer))] or [0.0] * self.width
+
+
 # ========== 成交流（TFI） ==========
 class TradeFlow:
     """
-    维护最近 TFI_WINDOW_SEC 的成交记录，计算主动买/卖比例
+    维护最近窗口内的成交，计算主动买比例（可按成交量加权）
     - Binance 逐笔成交字段 m: isBuyerMaker
       m == True  => 买方是做市商 => 主动方是卖方（主动卖）
       m == False => 主动方是买方（主动买）
+    - 窗口可按时间、按笔数或两者同时限定
     """
 
-    def __init__(self, window_sec=3):
+    def __init__(self, window_sec=3, max_trades=None, volume_weighted=False):
+        """
+        :param window_sec: 时间窗口（秒），None 表示不按时间
+        :param max_trades: 最多统计的最近成交笔数，None 表示不按笔数
+        :param volume_weighted: 是否按成交量 q 加权
+        """
         self.window_sec = window_sec
-        self.buffer = deque()  # (ts, is_aggr_buy)
-
-    def add(self, ts_ms, is_aggressive_buy):
-        now = ts_ms / 1000.0
-        self.buffer.append((now, 1 if is_aggressive_buy else 0))
-        # 清理过期
-        cutoff = now - self.window_sec
-        while self.buffer and self.buffer[0][0] < cutoff:
-            self.buffer.popleft()
-
-    def tfi(self):
+        self.max_trades = max_trades
+        self.volume_weighted = volume_weighted
+        window_ms = None if window_sec is None else int(window_sec * 1000)
+        # 列：(是否主动买, 成交量, 主动买成交量)
+        self.window = RollingSum(3, window_ms=window_ms, maxlen=max_trades)
+
+    @property
+    def label(self):
+        parts = []
+        if self.window_sec is not None:
+            parts.append(f"{self.window_sec}s")
+        if self.max_trades is not None:
+            parts.append(f"{self.max_trades}t")
+        if self.volume_weighted:
+            parts.append("vol")
+        return ",".join(parts)
+
+    def add(self, ts_ms, is_aggressive_buy, qty=0.0):
+        buy = 1 if is_aggressive_buy else 0
+        self.window.add(ts_ms, (buy, qty, qty * buy))
+
+    def tfi(self, now_ms=None):
         """
-        返回窗口内主动买比例（0~1）
+        返回窗口内主动买比例（0~1），无成交时返回 0.5
+        :param now_ms: 传入时先按该时间淘汰过期成交，否则以最新一笔成交时间为准
         """
-        if not self.buffer:
+        window = self.window
+        if now_ms is not None:
+            window.expire(now_ms)
+        if not window.buffer:
             return 0.5
-        buys = sum(x for _, x in self.buffer)
-        return buys / len(self.buffer)
+        sums = window.sums
+        if self.volume_weighted:
+            return sums[2] / sums[1] if sums[1] > 0 else 0.5
+        return sums[0] / len(window.buffer)
 
 
 # ========== 工具 ==========
@@ -154,23 +405,35 @@ async def fetch_snapshot(session, symbol, limit=100):
 
 # ========== 信号器 ==========
 class SignalEngine:
-    def __init__(self):
-        self.mid_ma = deque(maxlen=MID_SMA_LEN)
+    def __init__(self, ma_len=MID_SMA_LEN, ma_sec=MID_SMA_SEC):
+        """
+        :param ma_len: 中价短均线长度（tick 数），None 表示只按时间
+        :param ma_sec: 中价短均线时间窗口（秒），None 表示只按条数
+        """
+        window_ms = None if ma_sec is None else int(ma_sec * 1000)
+        self.mid_ma = RollingSum(1, window_ms=window_ms, maxlen=ma_len)
         self.last_signal_ts = 0.0
 
-    def update_mid(self, mid):
+    def update_mid(self, mid, ts_ms=None):
+        """
+        :param ts_ms: 中价对应的交易所时间（毫秒），按时间窗口时必传
+        """
         if mid is not None:
-            self.mid_ma.append(mid)
+            self.mid_ma.add(ts_ms, (mid,))
+
+    def ma(self):
+        """窗口填满前返回 None"""
+        if not self.mid_ma.filled or not self.mid_ma.buffer:
+            return None
+        return self.mid_ma.sums[0] / len(self.mid_ma.buffer)
 
     def mid_above_ma(self, last_mid):
-        if len(self.mid_ma) < self.mid_ma.maxlen:
-            return False
-        return last_mid > mean(self.mid_ma)
+        ma = self.ma()
+        return ma is not None and last_mid > ma
 
     def mid_below_ma(self, last_mid):
-        if len(self.mid_ma) < self.mid_ma.maxlen:
-            return False
-        return last_mid < mean(self.mid_ma)
+        ma = self.ma()
+        return ma is not None and last_mid < ma
 
     def throttled(self):
         now = time.time()
@@ -198,77 +461,339 @@ class SignalEngine:
         return "no-signal"
 
 
+# ========== 收包队列 ==========
+def _merge_levels(old, new):
+    """合并两批价位更新，同一价格以后到的为准"""
+    levels = dict((p, q) for p, q in old)
+    levels.update((p, q) for p, q in new)
+    return [[p, q] for p, q in levels.items()]
+
+
+class ConflatingQueue:
+    """
+    收包协程与处理协程之间的有界队列
+    - 成交永不丢弃、不合并；队列满时 put 等待，由 websockets 有界缓冲把背压传回对端
+    - 同一币对尚未被取走的 depth 增量与新到的连续增量（pu == 前一条 u）合并为一条：
+      U 取前者、u/pu 衔接、价位按后到覆盖，处理落后时只需应用一次且订单簿仍是最新
+    - bookTicker 与部分快照（replace_depth=True）本身就是完整状态，尚未取走的旧条目直接被新推送替换
+    - 统计当前深度、峰值深度、合并次数，以及每条消息的排队时长（queue_wait）
+    """
+
+    CONFLATE_EVENTS = ("depthUpdate", "bookTicker")
+
+    def __init__(self, maxsize=QUEUE_MAXSIZE, replace_depth=False):
+        """
+        :param maxsize: 队列上限（条）
+        :param replace_depth: depthUpdate 为部分快照时置 True，以替换代替合并
+        """
+        self.maxsize = maxsize
+        self.replace_depth = replace_depth
+        self.items = deque()  # [payload, 收包时间 ns]
+        self.pending = {}  # (币对, 事件) -> 队列中尚未取走的可合并条目
+        self.max_depth = 0
+        self.conflated = 0
+        self.error = None
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+
+    def __len__(self):
+        return len(self.items)
+
+    async def put(self, payload, recv_ns):
+        event = payload.get("e")
+        key = None
+        if event in self.CONFLATE_EVENTS:
+            key = (payload.get("s"), event)
+            item = self.pending.get(key)
+            if item is not None:
+                if event == "bookTicker" or self.replace_depth:
+                    item[0] = payload
+                elif payload.get("pu") == item[0].get("u"):
+                    head = item[0]
+                    head["u"] = payload.get("u")
+                    head["E"] = payload.get("E")
+                    head["b"] = _merge_levels(head.get("b", []), payload.get("b", []))
+                    head["a"] = _merge_levels(head.get("a", []), payload.get("a", []))
+                else:
+                    item = None
+                if item is not None:
+                    self.conflated += 1
+                    metrics.incr(key[0], "conflated")
+                    return
+        while len(self.items) >= self.maxsize:
+            self._not_full.clear()
+            await self._not_full.wait()
+        item = [payload, recv_ns]
+        self.items.append(item)
+        if key is not None:
+            self.pending[key] = item
+        if len(self.items) > self.max_depth:
+            self.max_depth = len(self.items)
+        self._not_empty.set()
+
+    def close(self, error):
+        """收包结束（连接断开），唤醒处理协程"""
+        self.error = error
+        self._not_empty.set()
+
+    async def get(self):
+        """
+        :return: (payload, 收包时间 ns)
+        :raise: 队列已空且收包已结束时抛出收包时的异常
+        """
+        while not self.items:
+            if self.error is not None:
+                raise self.error
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        item = self.items.popleft()
+        payload = item[0]
+        key = (payload.get("s"), payload.get("e"))
+        if self.pending.get(key) is item:
+            del self.pending[key]
+        self._not_full.set()
+        return item[0], item[1]
+
+    def stats(self):
+        return {"depth": len(self.items), "max_depth": self.max_depth, "conflated": self.conflated}
+
+
 # ========== 主流程 ==========
-async def run(symbol=SYMBOL):
-    ob = OrderBook()
-    tf = TradeFlow(window_sec=TFI_WINDOW_SEC)
-    se = SignalEngine()
+class SymbolState:
+    """单个币对的订单簿、成交流、信号器及同步状态"""
+
+    def __init__(self, symbol, mode=FEED_MODE):
+        self.symbol = symbol
+        self.mode = mode
+        self.ob = OrderBook()
+        self.ticker = BookTicker()  # partial / ticker 模式的实时最优价
+        self.tf = TradeFlow(window_sec=TFI_WINDOW_SEC, max_trades=TFI_WINDOW_TRADES,
+                            volume_weighted=TFI_VOLUME_WEIGHTED)
+        self.se = SignalEngine()
+        self.last_event_ms = None  # 最近一条推送的交易所事件时间 E（毫秒）
+        self.last_print = 0.0
+        self.snapshot_task = None  # 进行中的快照同步任务
+
+    def streams(self):
+        s = self.symbol.lower()
+        if self.mode == FEED_DIFF:
+            return [f"{s}@depth@100ms", f"{s}@trade"]
+        if self.mode == FEED_PARTIAL:
+            return [f"{s}@bookTicker", f"{s}@depth{PARTIAL_DEPTH_LEVELS}@{PARTIAL_DEPTH_SPEED}", f"{s}@aggTrade"]
+        if self.mode == FEED_TICKER:
+            return [f"{s}@bookTicker", f"{s}@aggTrade"]
+        raise ValueError(f"unknown feed mode: {self.mode}")
+
+    @property
+    def ready(self):
+        if self.mode == FEED_DIFF:
+            return self.ob.ready
+        if self.mode == FEED_PARTIAL:
+            return self.ticker.ready and self.ob.ready
+        return self.ticker.ready
+
+    @property
+    def obi_levels(self):
+        return 1 if self.mode == FEED_TICKER else TOP_N
+
+    def reset(self):
+        """连接重建时作废行情状态"""
+        self.ob.reset()
+        self.ticker.clear()
+
+    def quote(self):
+        """
+        :return: (买一, 卖一, 中价, OBI)；diff 模式全部取自订单簿，其余模式最优价取自 bookTicker
+        """
+        if self.mode == FEED_DIFF:
+            ob = self.ob
+            return ob.best_bid(), ob.best_ask(), ob.mid_price(), ob.top_n_imbalance(TOP_N)
+        t = self.ticker
+        obi = self.ob.top_n_imbalance(TOP_N) if self.mode == FEED_PARTIAL else t.imbalance()
+        return t.bid, t.ask, t.mid_price(), obi
 
-    streams = f"{DEPTH_STREAM}/{TRADE_STREAM}"
-    ws_url = WS_STREAM.format(streams=streams)
 
+async def sync_book(state, session, snapshot_sem):
+    """
+    拉取快照并与缓存的增量对齐，快照过旧时重试
+    所有币对共享 snapshot_sem，批量重同步时限制并发，避免触发 REST 权重限制
+    """
+    symbol = state.symbol
     while True:
         try:
-            async with aiohttp.ClientSession() as session:
-                # 1) 先拉一次快照
-                snapshot = await fetch_snapshot(session, symbol, DEPTH_LIMIT)
-                ob.load_snapshot(snapshot)
-
-                # 2) 打开 WS，接收增量
-                async with websockets.connect(ws_url, max_queue=None, ping_interval=20, ping_timeout=20) as ws:
-                    last_print = 0.0
-                    while True:
-                        msg = await ws.recv()
-                        data = json.loads(msg)
-                        stream = data.get("stream", "")
-                        payload = data.get("data", {})
-
-                        # depth 增量
-                        if stream.endswith("@depth@100ms"):
-                            # 注意：Binance depthUpdate 里是 'U','u','pu','b','a'
-                            ok = ob.apply_delta({
-                                "U": payload.get("U"),
-                                "u": payload.get("u"),
-                                "pu": payload.get("pu"),
-                                "b": payload.get("b", []),
-                                "a": payload.get("a", []),
-                            })
-                            if not ok:
-                                # 序列失配，重拉快照
-                                snapshot = await fetch_snapshot(session, symbol, DEPTH_LIMIT)
-                                ob.load_snapshot(snapshot)
-                                continue
-
-                            mid = ob.mid_price()
-                            se.update_mid(mid)
-
-                        # trade 逐笔
-                        elif stream.endswith("@trade"):
-                            # m == True: isBuyerMaker => 主动方是卖方
-                            is_aggr_buy = not payload.get("m", True)
-                            tf.add(payload.get("T"), is_aggr_buy)
-
-                        # 定期打印 & 产生信号
-                        now = time.time()
-                        if now - last_print >= PRINT_EVERY:
-                            last_print = now
-                            obi = ob.top_n_imbalance(TOP_N)
-                            tfi = tf.tfi()
-                            mid = ob.mid_price()
-                            bb, ba = ob.best_bid(), ob.best_ask()
-
-                            signal = se.decide(obi, tfi, mid)
-                            print(
-                                f"[{symbol}] "
-                                f"bb={bb:.2f} ba={ba:.2f} mid={mid:.2f}  "
-                                f"OBI({TOP_N})={obi:+.3f}  TFI({TFI_WINDOW_SEC}s)={tfi:.2f}  "
-                                f"signal={signal}"
-                            )
-                            # TODO: 在这里对接下单逻辑（风控：滑点、最小成交量、冷却时间等）
+            async with snapshot_sem:
+                with metrics.timed(symbol, "snapshot"):
+                    snapshot = await fetch_snapshot(session, symbol, DEPTH_LIMIT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[{symbol}] snapshot error: {e} — 1s 后重试")
+            await asyncio.sleep(1.0)
+            continue
+        if state.ob.load_snapshot(snapshot):
+            return
+        state.ob.resync()
+        metrics.incr(symbol, "resync")
+
+
+def start_sync(state, session, snapshot_sem):
+    if state.snapshot_task is not None:
+        state.snapshot_task.cancel()
+    state.snapshot_task = asyncio.create_task(sync_book(state, session, snapshot_sem))
+
+
+def handle_depth(state, payload, session, snapshot_sem):
+    # 注意：Binance depthUpdate 里是 'U','u','pu','b','a'
+    ob = state.ob
+    status = ob.apply_delta({
+        "U": payload.get("U"),
+        "u": payload.get("u"),
+        "pu": payload.get("pu"),
+        "b": payload.get("b", []),
+        "a": payload.get("a", []),
+    })
+    if status == OrderBook.GAP:
+        # 序列真正出现缺口，作废订单簿并后台重拉快照，期间增量继续缓存
+        ob.resync()
+        metrics.incr(state.symbol, "resync")
+        start_sync(state, session, snapshot_sem)
+        return
+    if status == OrderBook.APPLIED:
+        state.se.update_mid(ob.mid_price(), payload.get("E"))
+    metrics.incr(state.symbol, "depth")
+
+
+def handle_partial_depth(state, payload):
+    state.ob.load_partial(payload)
+    metrics.incr(state.symbol, "depth")
+
+
+def handle_book_ticker(state, payload):
+    if state.ticker.update(payload):
+        state.se.update_mid(state.ticker.mid_price(), payload.get("E"))
+    metrics.incr(state.symbol, "book_ticker")
+
+
+def handle_trade(state, payload):
+    # trade / aggTrade 字段相同（T, q, m）；m == True: isBuyerMaker => 主动方是卖方
+    is_aggr_buy = not payload.get("m", True)
+    state.tf.add(payload.get("T"), is_aggr_buy, float(payload.get("q", 0.0)))
+    metrics.incr(state.symbol, "trade")
+
+
+def maybe_signal(state):
+    """定期打印 & 产生信号"""
+    now = time.time()
+    if not state.ready or now - state.last_print < PRINT_EVERY:
+        return
+    state.last_print = now
+    symbol = state.symbol
+    with metrics.timed(symbol, "score"):
+        bb, ba, mid, obi = state.quote()
+        tfi = state.tf.tfi(state.last_event_ms)
+
+        signal = state.se.decide(obi, tfi, mid)
+    stale = state.last_event_ms is not None and metrics.check_age(
+        symbol, now * 1000 - state.last_event_ms, STALE_SIGNAL_MS)
+    print(
+        f"[{symbol}] "
+        f"bb={bb:.2f} ba={ba:.2f} mid={mid:.2f}  "
+        f"OBI({state.obi_levels})={obi:+.3f}  TFI({state.tf.label})={tfi:.2f}  "
+        f"signal={signal}{' STALE' if stale else ''}"
+    )
+    # TODO: 在这里对接下单逻辑（风控：滑点、最小成交量、冷却时间等）
+
+
+async def read_ws(ws, queue, states):
+    """收包协程：只做解码和入队，处理落后时由队列合并 depth 增量"""
+    try:
+        while True:
+            msg = await ws.recv()
+            t0 = time.perf_counter_ns()
+            payload = json.loads(msg).get("data", {})
+            symbol = payload.get("s")
+            if symbol not in states:
+                continue
+            metrics.observe_ns(symbol, "decode", time.perf_counter_ns() - t0)
+            await queue.put(payload, t0)
+    except Exception as e:
+        queue.close(e)
+    except asyncio.CancelledError:
+        queue.close(ConnectionError("ws reader cancelled"))
+        raise
+
+
+async def run_connection(states, session, snapshot_sem, mode=FEED_MODE):
+    """
+    一条组合流连接：订阅 states 中全部币对在 mode 下的行情流，按 payload 的 s 字段路由
+    收包与处理分离，中间为有界的合并队列；断线后重连，diff 模式下重新同步这些币对的订单簿
+    """
+    ws_url = WS_STREAM.format(streams="/".join(st for state in states.values() for st in state.streams()))
+    name = f"ws_queue[{next(iter(states))}]"
+    while True:
+        reader = None
+        try:
+            async with websockets.connect(ws_url, max_queue=WS_MAX_QUEUE, ping_interval=20, ping_timeout=20) as ws:
+                # 先连上 WS，增量在快照返回前由订单簿缓存；其余模式等待下一条推送即可
+                for state in states.values():
+                    state.reset()
+                    if mode == FEED_DIFF:
+                        start_sync(state, session, snapshot_sem)
+                queue = ConflatingQueue(replace_depth=mode == FEED_PARTIAL)
+                metrics.gauge(name, queue.stats)
+                reader = asyncio.create_task(read_ws(ws, queue, states))
+                while True:
+                    payload, recv_ns = await queue.get()
+                    state = states[payload["s"]]
+                    symbol = state.symbol
+                    t1 = time.perf_counter_ns()
+                    metrics.observe_ns(symbol, "queue_wait", t1 - recv_ns)
+                    if payload.get("E"):
+                        state.last_event_ms = payload["E"]
+                        metrics.observe(symbol, "exchange_to_ingest", (time.time() * 1000 - state.last_event_ms) * 1000)
+
+                    event = payload.get("e")
+                    if event == "bookTicker":
+                        handle_book_ticker(state, payload)
+                    elif event == "depthUpdate":
+                        if mode == FEED_DIFF:
+                            handle_depth(state, payload, session, snapshot_sem)
+                        else:
+                            handle_partial_depth(state, payload)
+                    elif event in ("trade", "aggTrade"):
+                        handle_trade(state, payload)
+                    metrics.observe_ns(symbol, "ingest", time.perf_counter_ns() - t1)
+                    maybe_signal(state)
 
         except Exception as e:
-            print("WS/HTTP error:", e, "— 5s 后重试")
+            print("WS error:", e, "— 5s 后重试")
             await asyncio.sleep(5.0)
+        finally:
+            if reader is not None:
+                reader.cancel()
+            for state in states.values():
+                if state.snapshot_task is not None:
+                    state.snapshot_task.cancel()
+                    state.snapshot_task = None
+
+
+async def run(symbols=SYMBOLS, mode=FEED_MODE):
+    """
+    多币对运行器：按 MAX_STREAMS_PER_CONN 把订阅拆分到多条组合流连接，
+    所有连接共享一个 HTTP 会话（连接池）和快照并发信号量
+    :param mode: 行情模式 FEED_DIFF / FEED_PARTIAL / FEED_TICKER
+    """
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
+    states = [SymbolState(sym.upper(), mode) for sym in symbols]
+    per_conn = max(1, MAX_STREAMS_PER_CONN // len(states[0].streams()))
+    snapshot_sem = asyncio.Semaphore(SNAPSHOT_CONCURRENCY)
+    async with aiohttp.ClientSession() as session:
+        tasks = []
+        for i in range(0, len(states), per_conn):
+            group = {state.symbol: state for state in states[i:i + per_conn]}
+            tasks.append(asyncio.create_task(run_connection(group, session, snapshot_sem, mode)))
+        await asyncio.gather(*tasks)
 
 
 if __name__ == "__main__":
@@ -283,4 +808,4 @@ if __name__ == "__main__":
          * 字段名不同（u/U/pu 机制不同），需要按 OKX 规格调整 apply_delta 逻辑
       - 实盘下单前请务必加：风控（最大下单量、滑点限制、冷却时间、仓位管理、限价委托等）
     """
-    asyncio.run(run(SYMBOL))
+    asyncio.run(run(SYMBOLS, FEED_MODE))
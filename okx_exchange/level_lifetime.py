@@ -0,0 +1,91 @@
+from collections import deque
+
+import numpy as np
+
+
+class LevelLifetimeTracker:
+    """
+    基于哈希时间轮的盘口价位存活时间跟踪
+    - touch 记录价位被看到的时间，首次出现时登记到 (now + idle_ms) 对应的槽位
+    - advance 推进时间轮，只检查到期槽位中的价位：仍在刷新则按最后出现时间重新挂载，否则过期回收
+    - 插入与过期均为均摊 O(1)，离开盘口的价位最终都会被回收，内存不随运行时间增长
+    - 过期时记录价位的存活时长，顺带得到中位挂单时长、闪单率等统计
+    """
+
+    def __init__(self, idle_ms, flicker_ms, tick_ms=100, slots=256, sample_size=2000):
+        """
+        :param idle_ms: 价位连续 idle_ms 未出现即视为撤离
+        :param flicker_ms: 存活短于该时长的价位计为闪单
+        :param tick_ms: 时间轮刻度（毫秒）
+        :param slots: 时间轮槽位数
+        :param sample_size: 存活时长统计样本数
+        """
+        self.idle_ms = idle_ms
+        self.flicker_ms = flicker_ms
+        self.tick_ms = tick_ms
+        self.wheel = [[] for _ in range(slots)]
+        self.entries = {}  # key -> [首次出现时间, 最后出现时间]
+        self.cur_tick = None
+        self.lifetimes = deque(maxlen=sample_size)  # 最近撤离价位的存活时长
+        self.expired = 0
+        self.flickers = 0
+
+    def _schedule(self, key, deadline):
+        tick = max(deadline // self.tick_ms, (self.cur_tick or 0) + 1)
+        self.wheel[tick % len(self.wheel)].append(key)
+
+    def touch(self, key, ts):
+        """
+        记录价位在 ts 时刻出现
+        :return: 已存活时长（毫秒）；首次出现返回 None
+        """
+        e = self.entries.get(key)
+        if e is None:
+            self.entries[key] = [ts, ts]
+            self._schedule(key, ts + self.idle_ms)
+            return None
+        if ts > e[1]:
+            e[1] = ts
+        return ts - e[0]
+
+    def advance(self, now):
+        """推进时间轮至 now，回收过期价位"""
+        tick = now // self.tick_ms
+        if self.cur_tick is None:
+            self.cur_tick = tick
+            return
+        # 跳过的刻度超过一圈时，每个槽位只需处理一次
+        start = max(self.cur_tick + 1, tick - len(self.wheel) + 1)
+        self.cur_tick = tick
+        n = len(self.wheel)
+        for t in range(start, tick + 1):
+            slot = self.wheel[t % n]
+            if not slot:
+                continue
+            self.wheel[t % n] = []
+            for key in slot:
+                e = self.entries.get(key)
+                if e is None:
+                    continue
+                deadline = e[1] + self.idle_ms
+                if deadline <= now:
+                    del self.entries[key]
+                    self._on_expire(e[1] - e[0])
+                else:
+                    self._schedule(key, deadline)
+
+    def _on_expire(self, lifetime):
+        self.lifetimes.append(lifetime)
+        self.expired += 1
+        if lifetime < self.flicker_ms:
+            self.flickers += 1
+
+    def stats(self):
+        """返回 (在册价位数, 中位存活时长毫秒, 闪单率)"""
+        if not self.lifetimes:
+            return len(self.entries), None, 0.0
+        lifetimes = np.fromiter(self.lifetimes, dtype=np.float64, count=len(self.lifetimes))
+        return len(self.entries), float(np.median(lifetimes)), float(np.mean(lifetimes < self.flicker_ms))
+
+    def __len__(self):
+        return len(self.entries)
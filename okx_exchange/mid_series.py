@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+
+
+class BucketedMidSeries:
+    """
+    固定时间间隔分桶的中间价序列
+    - 每个桶保存该时间段内最后一个中间价，无推送的桶沿用上一个值，内存与消息频率无关
+    - 维护相对锚定价的前缀和 Σ(x-ref)、Σ(x-ref)²，任意回看窗口的均值/标准差为 O(1) 查询
+    - 每写满一轮缓冲区以当前价重新锚定并重建前缀和（均摊 O(1)），避免累计误差和大数相消
+    """
+
+    def __init__(self, bucket_ms=100, horizon_ms=300_000):
+        """
+        :param bucket_ms: 分桶间隔（毫秒）
+        :param horizon_ms: 最长回看时间（毫秒）
+        """
+        self.bucket_ms = bucket_ms
+        self.size = max(1, horizon_ms // bucket_ms)
+        self.values = np.zeros(self.size)  # 桶值，下标 b % size
+        self.prefix1 = np.zeros(self.size + 1)  # Σ(x-ref)，下标 b % (size + 1)
+        self.prefix2 = np.zeros(self.size + 1)  # Σ(x-ref)²
+        self.ref = None
+        self.first_bucket = None
+        self.cur_bucket = None
+        self.last_mid = None
+        self._since_rebase = 0
+
+    def update(self, ts, mid):
+        """写入一个中间价观测"""
+        b = ts // self.bucket_ms
+        if self.cur_bucket is None or b - self.cur_bucket > self.size:
+            # 首次写入或长时间无数据：整体重置
+            n1 = self.size + 1
+            self.ref = mid
+            self.first_bucket = b
+            self.cur_bucket = b - 1
+            self.prefix1[(b - 1) % n1] = 0.0
+            self.prefix2[(b - 1) % n1] = 0.0
+            self._since_rebase = 0
+        elif b < self.cur_bucket:
+            # 乱序数据落在已封闭的桶内，忽略
+            return
+        if b > self.cur_bucket:
+            for i in range(self.cur_bucket + 1, b):
+                self._set(i, self.last_mid)
+            self._since_rebase += b - self.cur_bucket
+            self.cur_bucket = b
+        self.last_mid = mid
+        self._set(b, mid)
+        if self._since_rebase >= self.size:
+            self._rebase()
+
+    def advance(self, ts):
+        """推进到 ts 所在的桶，期间无推送的桶沿用最后一个中间价"""
+        if self.cur_bucket is not None and ts // self.bucket_ms > self.cur_bucket:
+            self.update(ts, self.last_mid)
+
+    def _set(self, b, x):
+        """写入桶值并更新该桶的前缀和（同一桶重复写入时基于上一桶前缀重算）"""
+        n1 = self.size + 1
+        d = x - self.ref
+        self.prefix1[b % n1] = self.prefix1[(b - 1) % n1] + d
+        self.prefix2[b % n1] = self.prefix2[(b - 1) % n1] + d * d
+        self.values[b % self.size] = x
+
+    def _rebase(self):
+        """以最新中间价重新锚定，重建前缀和"""
+        self._since_rebase = 0
+        n1 = self.size + 1
+        self.ref = self.last_mid
+        start = max(self.first_bucket, self.cur_bucket - self.size + 1)
+        self.prefix1[(start - 1) % n1] = 0.0
+        self.prefix2[(start - 1) % n1] = 0.0
+        for b in range(start, self.cur_bucket + 1):
+            d = self.values[b % self.size] - self.ref
+            self.prefix1[b % n1] = self.prefix1[(b - 1) % n1] + d
+            self.prefix2[b % n1] = self.prefix2[(b - 1) % n1] + d * d
+
+    def count(self, lookback_ms):
+        """回看窗口内的有效桶数"""
+        if self.cur_bucket is None:
+            return 0
+        k = max(1, lookback_ms // self.bucket_ms)
+        return int(min(k, self.size, self.cur_bucket - self.first_bucket + 1))
+
+    def mean_std(self, lookback_ms):
+        """
+        回看窗口内中间价的均值和标准差
+        :return: (mean, std, 桶数)；无数据时返回 (None, None, 0)
+        """
+        k = self.count(lookback_ms)
+        if not k:
+            return None, None, 0
+        n1 = self.size + 1
+        b = self.cur_bucket
+        s1 = self.prefix1[b % n1] - self.prefix1[(b - k) % n1]
+        s2 = self.prefix2[b % n1] - self.prefix2[(b - k) % n1]
+        m = s1 / k
+        var = max(s2 / k - m * m, 0.0)
+        return float(self.ref + m), math.sqrt(var), k
+
+
+class TimeEma:
+    """
+    按时间衰减的 EMA：alpha = 1 - exp(-dt / tau)
+    与消息频率无关，周期 period_ms 对应 1 秒采样下传统 EMA(period) 的时间常数（tau ≈ period / 2）
+    """
+
+    def __init__(self, period_ms):
+        self.tau_ms = period_ms / 2.0
+        self.value = None
+        self.last_ts = None
+
+    def update(self, ts, x):
+        if self.value is None:
+            self.value = x
+        else:
+            dt = ts - self.last_ts
+            if dt > 0:
+                alpha = 1.0 - math.exp(-dt / self.tau_ms)
+                self.value += alpha * (x - self.value)
+        if self.last_ts is None or ts > self.last_ts:
+            self.last_ts = ts
+        return self.value
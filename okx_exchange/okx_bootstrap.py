@@ -0,0 +1,113 @@
+import asyncio
+
+from okx import MarketData
+
+from okx_exchange.okx_decoder import parse_trade
+from utils.logging_setup import setup_logger
+
+# -----------------------------
+# 配置参数区
+# -----------------------------
+REST_FLAG = "1"  # 与 WS_URL 一致：0 实盘 / 1 模拟盘
+TRADES_LIMIT = 500  # 最近成交条数（接口上限 500）
+MID_BAR, MID_BAR_MS, MID_LIMIT = "1s", 1000, 300  # 预热中间价序列 / EMA 的 K 线
+VWAP_BAR, VWAP_BAR_MS, VWAP_LIMIT = "1m", 60_000, 60  # 预热 VWAP 的 K 线
+BOOTSTRAP_CONCURRENCY = 4  # 同时预热的合约数（每个合约 3 个请求），K 线接口限速约 40 次/2s
+RATE_LIMIT_CODE = "50011"  # OKX 限速错误码（Too Many Requests）
+RATE_LIMIT_RETRIES = 3  # 被限速时的重试次数
+RATE_LIMIT_BACKOFF_SEC = 1.0  # 重试等待基数（秒），第 n 次重试等待 n 倍
+
+logger = setup_logger("okx_bootstrap")
+
+_market_api = None
+
+
+def market_api():
+    """公共行情接口无需 API Key，进程内共享一个实例"""
+    global _market_api
+    if _market_api is None:
+        _market_api = MarketData.MarketAPI(flag=REST_FLAG, debug=False)
+    return _market_api
+
+
+def _data(resp, what, inst_id):
+    """检查 REST 响应，返回 data 列表（由新到旧）"""
+    if not resp or resp.get("code") != "0":
+        logger.warning(f"{inst_id} bootstrap {what} failed: {resp and resp.get('msg')}")
+        return []
+    return resp.get("data") or []
+
+
+async def _request(fn, **params):
+    """在线程池中调用同步 REST 接口，被限速时退避重试"""
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        resp = await asyncio.to_thread(fn, **params)
+        if not resp or resp.get("code") != RATE_LIMIT_CODE or attempt == RATE_LIMIT_RETRIES:
+            return resp
+        await asyncio.sleep(RATE_LIMIT_BACKOFF_SEC * (attempt + 1))
+
+
+async def fetch_history(inst_id):
+    """
+    并发拉取单合约的最近成交、秒级与分钟级 K 线
+    :return: (trades, mid_candles, vwap_candles)，均按时间由旧到新
+    """
+    api = market_api()
+    trades, mid_candles, vwap_candles = await asyncio.gather(
+        _request(api.get_trades, instId=inst_id, limit=str(TRADES_LIMIT)),
+        _request(api.get_candlesticks, instId=inst_id, bar=MID_BAR, limit=str(MID_LIMIT)),
+        _request(api.get_candlesticks, instId=inst_id, bar=VWAP_BAR, limit=str(VWAP_LIMIT)),
+    )
+    return (_data(trades, "trades", inst_id)[::-1],
+            _data(mid_candles, MID_BAR, inst_id)[::-1],
+            _data(vwap_candles, VWAP_BAR, inst_id)[::-1])
+
+
+def warm_start(ctx, trades, mid_candles, vwap_candles):
+    """
+    用历史数据预热 SymbolContext，需在订阅实时推送前调用以保证时间有序
+    - 秒级收盘价写入中间价序列和 EMA
+    - 分钟 K 线按典型价×成交量补齐最早一笔成交之前的 VWAP，之后的部分由逐笔成交累计，避免重复
+    - 逐笔成交写入成交缓存、TFI 窗口和 VWAP
+    K 线行格式：[ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm]
+    """
+    parsed = [parse_trade(t, ctx.symbol) for t in trades]
+    first_trade_ts = parsed[0].ts if parsed else None
+
+    for c in mid_candles:
+        ts, close = int(c[0]), float(c[4])
+        ctx.mid_series.update(ts, close)
+        ctx.ema1 = ctx.ema1_state.update(ts, close)
+        ctx.ema2 = ctx.ema2_state.update(ts, close)
+
+    for c in vwap_candles:
+        ts = int(c[0])
+        if first_trade_ts is not None and ts + VWAP_BAR_MS > first_trade_ts:
+            break
+        vol = float(c[5])
+        if vol > 0:
+            typical = (float(c[2]) + float(c[3]) + float(c[4])) / 3.0
+            ctx.update_vwap_on_trade(ts, typical, vol)
+
+    for trade in parsed:
+        ctx.process_trade(trade)
+    logger.info(f"{ctx.symbol} warm start: {len(parsed)} trades, {len(mid_candles)} {MID_BAR} candles, "
+                f"{len(vwap_candles)} {VWAP_BAR} candles")
+
+
+async def bootstrap(contexts):
+    """
+    并发预热全部合约，同时拉取的合约数不超过 BOOTSTRAP_CONCURRENCY 以免触发限速；
+    单个合约失败时保持冷启动，不影响其他合约
+    """
+    sem = asyncio.Semaphore(BOOTSTRAP_CONCURRENCY)
+
+    async def one(ctx):
+        try:
+            async with sem:
+                history = await fetch_history(ctx.symbol)
+            warm_start(ctx, *history)
+        except Exception as e:
+            logger.warning(f"{ctx.symbol} bootstrap failed, starting cold: {e}")
+
+    await asyncio.gather(*(one(ctx) for ctx in contexts))
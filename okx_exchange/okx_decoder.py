@@ -0,0 +1,110 @@
+import json
+
+import numpy as np
+
+# -----------------------------
+# JSON 解析后端：优先 orjson / msgspec，未安装时退回标准库
+# -----------------------------
+try:
+    import orjson
+
+    loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    try:
+        import msgspec
+
+        loads = msgspec.json.Decoder().decode
+        JSON_BACKEND = "msgspec"
+    except ImportError:
+        loads = json.loads
+        JSON_BACKEND = "json"
+
+_EMPTY_LEVELS = np.empty((0, 2), dtype=np.float64)
+
+
+class BookUpdate:
+    """
+    books 频道单条推送的解析结果
+    - bids / asks: (n, 2) float64 数组，列为价格、数量
+    - bids_raw / asks_raw: 原始档位字符串，仅用于 checksum
+    """
+    __slots__ = ("inst_id", "action", "bids", "asks", "bids_raw", "asks_raw",
+                 "seq_id", "prev_seq_id", "checksum", "ts")
+
+    def __init__(self, inst_id, action, bids, asks, bids_raw, asks_raw, seq_id, prev_seq_id, checksum, ts):
+        self.inst_id = inst_id
+        self.action = action
+        self.bids = bids
+        self.asks = asks
+        self.bids_raw = bids_raw
+        self.asks_raw = asks_raw
+        self.seq_id = seq_id
+        self.prev_seq_id = prev_seq_id
+        self.checksum = checksum
+        self.ts = ts
+
+
+class Trade:
+    """trades 频道单笔成交的解析结果，side 为 1（主动买）/ -1（主动卖）"""
+    __slots__ = ("inst_id", "ts", "px", "sz", "side")
+
+    def __init__(self, inst_id, ts, px, sz, side):
+        self.inst_id = inst_id
+        self.ts = ts
+        self.px = px
+        self.sz = sz
+        self.side = side
+
+
+def parse_levels(levels):
+    """将 [[px, sz, ...], ...] 字符串档位一次性解析为 (n, 2) float64 数组"""
+    if not levels:
+        return _EMPTY_LEVELS
+    return np.array([lv[:2] for lv in levels], dtype=np.float64)
+
+
+def _int_or_none(v):
+    return int(v) if v is not None else None
+
+
+def parse_book(data0, action="snapshot", inst_id=None):
+    """
+    解析 books 推送中的 data[0]
+    :param data0: 推送中的 data[0]
+    :param action: snapshot / update，books5 等频道没有 action，按快照处理
+    :param inst_id: 合约
+    :return: BookUpdate
+    """
+    bids_raw = data0.get("bids", [])
+    asks_raw = data0.get("asks", [])
+    return BookUpdate(
+        inst_id, action,
+        parse_levels(bids_raw), parse_levels(asks_raw), bids_raw, asks_raw,
+        _int_or_none(data0.get("seqId")), _int_or_none(data0.get("prevSeqId")),
+        _int_or_none(data0.get("checksum")), int(data0.get("ts", 0)),
+    )
+
+
+def parse_trade(trade, inst_id=None):
+    """解析 trades 推送中的单笔成交"""
+    return Trade(inst_id or trade.get("instId"), int(trade["ts"]), float(trade["px"]), float(trade["sz"]),
+                 1 if trade["side"] == "buy" else -1)
+
+
+def decode_message(msg):
+    """
+    将已解析的推送转换为类型化结构
+    :return: (channel, inst_id, payload)；books 返回 BookUpdate，trades 返回 [Trade, ...]，其他返回 None
+    """
+    arg = msg.get("arg")
+    data = msg.get("data")
+    if not arg or not data:
+        return None, None, None
+    ch = arg.get("channel", "")
+    inst_id = arg.get("instId")
+    if ch.startswith("books"):
+        return "books", inst_id, parse_book(data[0], msg.get("action", "snapshot"), inst_id)
+    if ch == "trades":
+        return "trades", inst_id, [parse_trade(t, inst_id) for t in data]
+    return ch, inst_id, None
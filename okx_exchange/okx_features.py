@@ -0,0 +1,38 @@
+from dataclasses import dataclass, asdict
+
+
+@dataclass(slots=True)
+class FeatureSnapshot:
+    """
+    单次计算的订单流特征快照，由 SymbolContext.compute_features 生成
+    - 所有基础量每次只计算一次，供打分、信号记录和日志共用，其他策略也可直接复用
+    """
+    ts: int  # 计算时间（毫秒）
+    best_bid: float
+    best_ask: float
+    mid: float
+    bid_vol: float  # 前 DEPTH_LEVEL 档买盘总量（已做闪单折扣）
+    ask_vol: float  # 前 DEPTH_LEVEL 档卖盘总量
+    depth_bid: float  # 按档位衰减加权的买盘深度
+    depth_ask: float  # 按档位衰减加权的卖盘深度
+    depth: float  # 加权总深度
+    obi: float  # 订单簿不平衡
+    tfi: float  # 成交流入 [-1, 1]
+    buy_vol: float  # 窗口内主动买量
+    sell_vol: float  # 窗口内主动卖量
+    uptick_ratio: float  # 成交价上行比率 [0, 1]
+    sweep: int  # 扫单方向 -1 / 0 / 1
+    ofi_raw: float  # OFI 窗口内加权多档订单流（MLOFI）净量，撤单占比过高时折半
+    refill_bid: float
+    refill_ask: float
+    vol_spike: float  # 最新成交量 / 最近 20 笔均量
+    vol_bps: float  # 中间价波动率（基点）
+    ema1: float
+    ema2: float
+    vwap: float
+    n_trades: int  # 成交缓存条数
+    median_rest_ms: float  # 中位挂单存活时长
+    flicker_rate: float  # 闪单率
+
+    def as_dict(self):
+        return asdict(self)
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class MultiLevelOfi:
+    """
+    向量化多档订单流不平衡（MLOFI）
+    - 保存上一次前 depth 档的价格/数量数组，每次更新用数组运算得到逐档订单流
+    - 买盘第 i 档：价格上移记 +q(t)，不变记 q(t)-q(t-1)，下移记 -q(t-1)；卖盘方向相反
+    - 结果按预先计算的档位衰减权重加权，不足 depth 档时用 ±inf 价格、0 数量补齐
+    """
+
+    def __init__(self, depth, decay=0.9):
+        """
+        :param depth: 档位数
+        :param decay: 档位权重衰减系数，第 i 档权重为 decay ** i
+        """
+        self.depth = depth
+        self.weights = decay ** np.arange(depth)
+        self.prev = None  # (bid_px, bid_sz, ask_px, ask_sz)
+
+    def reset(self):
+        self.prev = None
+
+    def to_arrays(self, levels, fill_px):
+        """将 [(价格, 数量), ...] 转为定长价格、数量数组"""
+        px = np.full(self.depth, fill_px)
+        sz = np.zeros(self.depth)
+        n = min(len(levels), self.depth)
+        if n:
+            arr = np.array(levels[:n], dtype=np.float64)
+            px[:n] = arr[:, 0]
+            sz[:n] = arr[:, 1]
+        return px, sz
+
+    def update(self, bids, asks):
+        """
+        输入新的前 depth 档盘口，返回加权的逐档买方流、卖方流
+        :param bids: [(价格, 数量), ...]，价格从高到低
+        :param asks: [(价格, 数量), ...]，价格从低到高
+        :return: (bid_flow, ask_flow, bid_sz, ask_sz)，首次调用时订单流为全 0
+        """
+        bid_px, bid_sz = self.to_arrays(bids, -np.inf)
+        ask_px, ask_sz = self.to_arrays(asks, np.inf)
+        prev = self.prev
+        self.prev = (bid_px, bid_sz, ask_px, ask_sz)
+        if prev is None:
+            zeros = np.zeros(self.depth)
+            return zeros, zeros, bid_sz, ask_sz
+        p_bid_px, p_bid_sz, p_ask_px, p_ask_sz = prev
+        bid_flow = np.where(bid_px > p_bid_px, bid_sz,
+                            np.where(bid_px == p_bid_px, bid_sz - p_bid_sz, -p_bid_sz))
+        ask_flow = np.where(ask_px < p_ask_px, ask_sz,
+                            np.where(ask_px == p_ask_px, ask_sz - p_ask_sz, -p_ask_sz))
+        bid_flow *= self.weights
+        ask_flow *= self.weights
+        return bid_flow, ask_flow, bid_sz, ask_sz
@@ -0,0 +1,169 @@
+import zlib
+from bisect import bisect_left, insort
+
+from okx_exchange.okx_decoder import parse_book
+
+# -----------------------------
+# OKX 增量订单簿
+# -----------------------------
+CHECKSUM_DEPTH = 25  # OKX 校验和使用的档位数
+
+
+def okx_checksum(bid_levels, ask_levels, depth=CHECKSUM_DEPTH):
+    """
+    按 OKX 规则计算订单簿校验和
+    买卖盘前 depth 档交替拼接为 "bidPx:bidSz:askPx:askSz:..."，取 CRC32 并转换为有符号 32 位整数
+    :param bid_levels: 买盘 [(px_str, sz_str), ...]，价格从高到低
+    :param ask_levels: 卖盘 [(px_str, sz_str), ...]，价格从低到高
+    :param depth: 参与计算的档位数
+    :return: 有符号 32 位校验和
+    """
+    parts = []
+    for i in range(depth):
+        if i < len(bid_levels):
+            parts.append(bid_levels[i][0])
+            parts.append(bid_levels[i][1])
+        if i < len(ask_levels):
+            parts.append(ask_levels[i][0])
+            parts.append(ask_levels[i][1])
+    crc = zlib.crc32(":".join(parts).encode())
+    return crc - (1 << 32) if crc >= (1 << 31) else crc
+
+
+class _BookSide:
+    """
+    单边价位簿，按"优先级"升序保存价格键，最优价始终位于下标 0
+    - 卖盘键为价格本身，买盘键为价格取负
+    - levels: key -> (px_str, sz_str, sz)，保留原始字符串用于校验和
+    """
+
+    def __init__(self, is_bid):
+        self.is_bid = is_bid
+        self.keys = []
+        self.levels = {}
+
+    def clear(self):
+        self.keys.clear()
+        self.levels.clear()
+
+    def update(self, px_str, sz_str, price, size):
+        """
+        更新单个价位，数量为 0 时删除
+        :param px_str: 原始价格字符串
+        :param sz_str: 原始数量字符串
+        :param price: 已解析的价格
+        :param size: 已解析的数量
+        :return: (价格, 旧数量, 新数量)
+        """
+        key = -price if self.is_bid else price
+        old = self.levels.get(key)
+        old_size = old[2] if old else 0.0
+        if size == 0.0:
+            if old is not None:
+                del self.levels[key]
+                del self.keys[bisect_left(self.keys, key)]
+        else:
+            if old is None:
+                insort(self.keys, key)
+            self.levels[key] = (px_str, sz_str, size)
+        return price, old_size, size
+
+    def top(self, n):
+        """返回前 n 档 [(价格, 数量), ...]，无需排序"""
+        levels = self.levels
+        return [(abs(k), levels[k][2]) for k in self.keys[:n]]
+
+    def top_raw(self, n):
+        """返回前 n 档原始字符串 [(px_str, sz_str), ...]"""
+        levels = self.levels
+        return [levels[k][:2] for k in self.keys[:n]]
+
+    def best(self):
+        return abs(self.keys[0]) if self.keys else None
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class OkxOrderBook:
+    """
+    OKX books 频道的增量订单簿
+    - 处理 snapshot / update 两类推送
+    - 校验 seqId / prevSeqId 连续性与 checksum，出现缺口时标记为未就绪，由调用方重新订阅
+    """
+
+    def __init__(self, checksum_depth=CHECKSUM_DEPTH):
+        self.bids = _BookSide(is_bid=True)
+        self.asks = _BookSide(is_bid=False)
+        self.checksum_depth = checksum_depth
+        self.seq_id = None
+        self.ts = 0
+        self.ready = False
+        self.resync_count = 0  # 因缺口或校验失败导致的重新同步次数
+
+    def reset(self):
+        """清空订单簿，等待新的 snapshot"""
+        self.bids.clear()
+        self.asks.clear()
+        self.seq_id = None
+        self.ready = False
+
+    def apply(self, data0, action="snapshot"):
+        """
+        应用一条原始 books 推送
+        :param data0: 推送中的 data[0]，包含 bids / asks / seqId / prevSeqId / checksum / ts
+        :param action: "snapshot" 或 "update"，books5 等频道没有 action，按快照处理
+        :return: True 表示已应用；False 表示序列缺口或校验失败，需要重新同步
+        """
+        return self.apply_update(parse_book(data0, action))
+
+    def apply_update(self, update):
+        """
+        应用一条已解析的 books 推送
+        :param update: okx_decoder.BookUpdate
+        :return: True 表示已应用；False 表示序列缺口或校验失败，需要重新同步；
+                 未就绪（等待快照）时的增量同样返回 False，调用方应先检查 ready 以区分两者
+        """
+        if update.action == "snapshot":
+            self.bids.clear()
+            self.asks.clear()
+        else:
+            if not self.ready:
+                return False
+            if update.prev_seq_id is not None and self.seq_id is not None and update.prev_seq_id != self.seq_id:
+                return self._mark_gap()
+
+        for (px, sz, *_), (price, size) in zip(update.bids_raw, update.bids.tolist()):
+            self.bids.update(px, sz, price, size)
+        for (px, sz, *_), (price, size) in zip(update.asks_raw, update.asks.tolist()):
+            self.asks.update(px, sz, price, size)
+
+        if update.checksum is not None and self.checksum() != update.checksum:
+            return self._mark_gap()
+
+        self.seq_id = update.seq_id
+        self.ts = update.ts
+        self.ready = True
+        return True
+
+    def _mark_gap(self):
+        self.reset()
+        self.resync_count += 1
+        return False
+
+    def checksum(self):
+        """按当前订单簿计算 OKX 校验和"""
+        depth = self.checksum_depth
+        return okx_checksum(self.bids.top_raw(depth), self.asks.top_raw(depth), depth)
+
+    def top_bids(self, n):
+        return self.bids.top(n)
+
+    def top_asks(self, n):
+        return self.asks.top(n)
+
+    def best_bid(self):
+        return self.bids.best()
+
+    def best_ask(self):
+        return self.asks.best()
@@ -0,0 +1,200 @@
+import argparse
+import json
+import logging
+import random
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from okx_exchange.okx_decoder import loads, parse_book
+from okx_exchange.okx_orderbook import OkxOrderBook
+from okx_exchange.okx_orderbook_trend_bot import SymbolContext, handle_message, recompute_and_decide, \
+    RECALC_THROTTLE_MS
+from okx_exchange.okx_replay import VirtualClock
+
+PERCENTILES = (50, 99, 99.9)
+
+
+# -----------------------------
+# 合成行情：与 OKX books / trades 推送格式一致，带正确的 seqId 与 checksum
+# -----------------------------
+class SyntheticOkxStream:
+    """
+    单合约合成行情流
+    - 维护一本内部订单簿，生成 snapshot + update 推送并计算真实 checksum
+    - 按 trade_ratio 概率穿插成交推送
+    """
+
+    def __init__(self, inst_id, seed=0, levels=50, tick=0.1, mid=100.0, trade_ratio=0.3):
+        self.inst_id = inst_id
+        self.rnd = random.Random(seed)
+        self.tick = tick
+        self.mid = mid
+        self.trade_ratio = trade_ratio
+        self.book = OkxOrderBook()
+        self.seq_id = 0
+        self.bids = {round(mid - tick * (i + 1), 1): self._size() for i in range(levels)}
+        self.asks = {round(mid + tick * (i + 1), 1): self._size() for i in range(levels)}
+        self.started = False
+
+    def _size(self):
+        return round(self.rnd.uniform(500, 5000), 2)
+
+    def _frame(self, action, bids, asks, ts):
+        prev = self.seq_id
+        self.seq_id += 1
+        data0 = {"bids": bids, "asks": asks, "seqId": self.seq_id, "prevSeqId": prev if prev else -1, "ts": str(ts)}
+        self.book.apply_update(parse_book(data0, action))
+        data0["checksum"] = self.book.checksum()
+        return json.dumps({"arg": {"channel": "books", "instId": self.inst_id}, "action": action, "data": [data0]})
+
+    def next_frame(self, ts):
+        """生成下一帧原始推送（JSON 字符串）"""
+        if not self.started:
+            self.started = True
+            bids = [[f"{p}", f"{s}", "0", "1"] for p, s in sorted(self.bids.items(), reverse=True)]
+            asks = [[f"{p}", f"{s}", "0", "1"] for p, s in sorted(self.asks.items())]
+            return self._frame("snapshot", bids, asks, ts)
+        rnd = self.rnd
+        if rnd.random() < self.trade_ratio:
+            side = rnd.choice(("buy", "sell"))
+            px = min(self.asks) if side == "buy" else max(self.bids)
+            trade = {"instId": self.inst_id, "px": f"{px}", "sz": f"{rnd.uniform(1, 300):.2f}", "side": side,
+                     "ts": str(ts)}
+            return json.dumps({"arg": {"channel": "trades", "instId": self.inst_id}, "data": [trade]})
+        side = self.bids if rnd.random() < 0.5 else self.asks
+        changes = []
+        for p in rnd.sample(list(side), min(3, len(side))):
+            if rnd.random() < 0.2 and len(side) > 20:
+                del side[p]
+                changes.append([f"{p}", "0", "0", "0"])
+            else:
+                side[p] = self._size()
+                changes.append([f"{p}", f"{side[p]}", "0", "1"])
+        if side is self.bids:
+            return self._frame("update", changes, [], ts)
+        return self._frame("update", [], changes, ts)
+
+
+# -----------------------------
+# 基准测试
+# -----------------------------
+def _percentiles(samples_ns):
+    if not samples_ns:
+        return {}
+    arr = np.asarray(samples_ns, dtype=np.float64) / 1000.0
+    out = {f"p{p:g}_us": float(np.percentile(arr, p)) for p in PERCENTILES}
+    out["mean_us"] = float(arr.mean())
+    out["count"] = int(arr.size)
+    return out
+
+
+def _rss_kb():
+    """当前进程常驻内存（KB），读取 /proc/self/statm，不可用时返回 None"""
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return None
+
+
+def run_case(rate, n_symbols, seconds, seed=0, trace_alloc=False):
+    """
+    以 rate 条/秒（所有合约合计）的虚拟速率驱动 n_symbols 个合约 seconds 秒
+    :return: 单个用例的结果字典
+    """
+    clock = VirtualClock(1_700_000_000_000)
+    symbols = [f"SYN{i}-USDT-SWAP" for i in range(n_symbols)]
+    streams = [SyntheticOkxStream(sym, seed=seed + i) for i, sym in enumerate(symbols)]
+
+    # 预生成全部帧，避免把造数成本计入测量
+    total = int(rate * seconds)
+    step_ms = 1000.0 / rate
+    frames = []
+    for k in range(total):
+        ts = clock.now + int(k * step_ms)
+        stream = streams[k % n_symbols]
+        frames.append((ts, stream.inst_id, stream.next_frame(ts)))
+
+    # 内存以本用例前后的当前 RSS 差值计：ru_maxrss 是整个进程的峰值，多用例时无法横向比较；
+    # 基线取在造数之后，预生成的帧不计入
+    rss_before = _rss_kb()
+    contexts = {sym: SymbolContext(sym, clock=clock) for sym in symbols}
+
+    ingest_ns = []
+    recompute_ns = []
+    if trace_alloc:
+        tracemalloc.start()
+    perf = time.perf_counter_ns
+    wall_start = perf()
+    for ts, inst_id, raw in frames:
+        clock.now = ts
+        ctx = contexts[inst_id]
+        t0 = perf()
+        handle_message(ctx, loads(raw))
+        t1 = perf()
+        ingest_ns.append(t1 - t0)
+        if ctx.dirty and ts - ctx.last_calc_ms >= RECALC_THROTTLE_MS:
+            ctx.dirty = False
+            recompute_and_decide(ctx, ts)
+            recompute_ns.append(perf() - t1)
+    wall_ns = perf() - wall_start
+    rss_after = _rss_kb()
+    alloc = {}
+    if trace_alloc:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        alloc = {"traced_current_bytes": current, "traced_peak_bytes": peak}
+
+    recompute_mean_s = (sum(recompute_ns) / len(recompute_ns) / 1e9) if recompute_ns else 0.0
+    return {
+        "rate": rate,
+        "symbols": n_symbols,
+        "virtual_seconds": seconds,
+        "messages": total,
+        "wall_seconds": wall_ns / 1e9,
+        "throughput_msgs_per_sec": total / (wall_ns / 1e9) if wall_ns else 0.0,
+        "ingest": _percentiles(ingest_ns),
+        "recompute": _percentiles(recompute_ns),
+        # 单核在 RECALC_THROTTLE_MS 节奏下仅计算信号可承载的合约数（不含接收成本）
+        "symbols_per_core_at_cadence": (RECALC_THROTTLE_MS / 1000 / recompute_mean_s) if recompute_mean_s else None,
+        "rss_delta_kb": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        **alloc,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OKX 订单流打分引擎延迟/吞吐基准测试")
+    parser.add_argument("--rates", type=int, nargs="+", default=[1_000, 10_000], help="合计消息速率（条/秒）")
+    parser.add_argument("--symbols", type=int, nargs="+", default=[1, 10], help="合约数量")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每个用例的虚拟时长（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-alloc", action="store_true", help="使用 tracemalloc 统计内存分配（会显著变慢）")
+    parser.add_argument("--with-logging", action="store_true", help="保留 INFO 日志输出")
+    parser.add_argument("--out", help="结果输出 JSON 文件，便于回归比对")
+    args = parser.parse_args()
+
+    if not args.with_logging:
+        logging.disable(logging.INFO)
+
+    results = []
+    for rate in args.rates:
+        for n in args.symbols:
+            res = run_case(rate, n, args.seconds, args.seed, args.trace_alloc)
+            results.append(res)
+            print(f"rate={rate} symbols={n} msgs={res['messages']} "
+                  f"throughput={res['throughput_msgs_per_sec']:.0f}/s "
+                  f"ingest p50/p99/p999={res['ingest'].get('p50_us', 0):.1f}/"
+                  f"{res['ingest'].get('p99_us', 0):.1f}/{res['ingest'].get('p99.9_us', 0):.1f}us "
+                  f"recompute p50/p99/p999={res['recompute'].get('p50_us', 0):.1f}/"
+                  f"{res['recompute'].get('p99_us', 0):.1f}/{res['recompute'].get('p99.9_us', 0):.1f}us "
+                  f"rss+={res['rss_delta_kb']}KB")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fp:
+            json.dump({"created": int(time.time()), "results": results}, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,51 @@
 import asyncio
-import json
 import time
-import copy
 from collections import deque
 
 import numpy as np
-from okx.websocket.WsPublicAsync import WsPublicAsync
 
+from okx_exchange.level_lifetime import LevelLifetimeTracker
+from okx_exchange.okx_bootstrap import bootstrap
+from okx_exchange.mid_series import BucketedMidSeries, TimeEma
+from okx_exchange.okx_decoder import decode_message, parse_book, parse_trade
+from okx_exchange.okx_features import FeatureSnapshot
+from okx_exchange.okx_mlofi import MultiLevelOfi
+from okx_exchange.okx_orderbook import OkxOrderBook
+from okx_exchange.okx_public_feed import OkxPublicFeed
+from okx_exchange.okx_recorder import FrameRecorder
+from okx_exchange.okx_signal_store import SignalStore
 from okx_exchange.okx_trend_trade_strategy_bot import TREND_SYMBOL_LIST
-from utils.logging_setup import setup_logger
+from okx_exchange.rolling_window import RollingWindowSum
+from okx_exchange.vwap_engine import VwapEngine
+from utils.latency import metrics, serve_metrics
+from utils.logging_setup import setup_logger, queue_size
+from utils.ring_buffer import RingBuffer
 
 # -----------------------------
 # 配置参数区
 # -----------------------------
 WS_URL = "wss://wspap.okx.com:8443/ws/v5/public"
+WS_POOL_SIZE = 1  # 公共连接数，所有合约按轮转分配到各连接
+RECORD_PATH = None  # 原始帧录制文件（如 "logs/okx_frames.gz"），None 表示不录制，可用 okx_replay 回放
+SIGNAL_STORE_DIR = "logs/signals"  # 列式信号存储目录（按合约/日期分区，okx_signal_store.load_day 读取），None 表示不存储
+WARM_START = True  # 启动时通过 REST 拉取最近成交与 K 线预热指标
 
 DEPTH_LEVEL = 10  # 盘口深度
 WINDOW = 60  # 统计窗口（秒）
 VOLUME_SPIKE_FACTOR = 2.0  # 成交量突增因子
 ORDER_LIFETIME_MS = 5000  # 订单生存时间（毫秒）
+LEVEL_IDLE_MS = 5000  # 价位离开盘口视图超过该时长即视为撤离（毫秒）
 MIN_VOL_SAMPLES = 40  # 最小成交样本数
 OFI_WINDOW_MS = 3000  # OFI指标窗口（毫秒）
 
 EMA1_SEC = 60  # EMA1周期（秒）
 EMA2_SEC = 300  # EMA2周期（秒）
+MID_BUCKET_MS = 100  # 中间价分桶间隔（毫秒）
+VWAP_WINDOWS_MS = {"5m": 300_000, "1h": 3_600_000}  # 滚动 VWAP 窗口，另含 UTC 交易日窗口 "session"
+VWAP_BUCKET_MS = 1000  # VWAP 分桶间隔（毫秒）
+VWAP_GATE_WINDOW = "1h"  # 趋势门控使用的 VWAP 窗口
 RECALC_THROTTLE_MS = 200  # 计算节流（毫秒）
+EVENT_DRIVEN = True  # 事件驱动计算（False 时退回 20ms 轮询）
 
 VOL_LOW_BPS = 8  # 低波动阈值
 VOL_HIGH_BPS = 35  # 高波动阈值
@@ -36,8 +57,21 @@ EXIT_LONG = 68  # 做多离场分数
 ENTER_SHORT = 18  # 做空入场分数
 EXIT_SHORT = 32  # 做空离场分数
 COOLDOWN_MS = 1500  # 信号冷却时间（毫秒）
+STALE_SIGNAL_MS = 1000  # 最新行情的交易所时间到决策超过该时长即标记为过期信号（毫秒）
+METRICS_PORT = 9108  # 本地延迟指标接口端口（http://127.0.0.1:9108/metrics），None 表示不启动
 
-logger = setup_logger("okx_orderbook_trend")
+LOG_RATE_LIMIT_SEC = 1.0  # 主日志同一调用位置的 INFO 日志最小间隔（秒）
+
+BUFFER_CAPACITY = 20000  # 成交、盘口增减量环形缓冲区容量
+
+# 成交记录列：时间戳、价格、数量、方向（1 买 / -1 卖）
+TRADE_DTYPE = [("ts", np.int64), ("px", np.float64), ("sz", np.float64), ("side", np.int8)]
+# 盘口增减量列：每条盘口消息聚合一行
+BOOK_CHANGE_DTYPE = [("ts", np.int64), ("bid_add", np.float64), ("bid_rem", np.float64),
+                     ("ask_add", np.float64), ("ask_rem", np.float64)]
+
+# 主日志在每次计算时都会输出，按调用位置限流；信号日志完整保留
+logger = setup_logger("okx_orderbook_trend", rate_limit_sec=LOG_RATE_LIMIT_SEC)
 signal_logger = setup_logger("okx_orderbook_trend_signals")
 
 
@@ -51,30 +85,61 @@ class SymbolContext:
     单合约上下文，维护盘口、成交、指标等状态
     """
 
-    def __init__(self, symbol):
+    def __init__(self, symbol, clock=None):
+        """
+        :param symbol: 合约
+        :param clock: 毫秒时钟，默认读取系统时间；回放时注入虚拟时钟
+        """
         self.symbol = symbol
-        self.trades_buffer = deque(maxlen=20000)  # 成交缓存
-        self.mid_buffer = deque(maxlen=EMA2_SEC * 10)  # 中间价缓存
-        self.orderbook_snapshot = None  # 当前盘口快照
-        self.prev_orderbook_snapshot = None  # 上一盘口快照
-        self.last_order_seen = {}  # 记录订单出现时间
-
-        # 盘口增减量缓存
-        self.ask_added = deque(maxlen=20000)
-        self.ask_removed = deque(maxlen=20000)
-        self.bid_added = deque(maxlen=20000)
-        self.bid_removed = deque(maxlen=20000)
+        self.clock = clock or now_ms
+        self.trades_buffer = RingBuffer(BUFFER_CAPACITY, TRADE_DTYPE)  # 成交缓存
+        self.book_changes = RingBuffer(BUFFER_CAPACITY, BOOK_CHANGE_DTYPE)  # 盘口增减量缓存
+        self.mid_series = BucketedMidSeries(MID_BUCKET_MS, EMA2_SEC * 1000)  # 分桶中间价序列
+        self.book = OkxOrderBook()  # 增量订单簿
+        self.need_resync = False  # 订单簿出现缺口，需要重新订阅
+        self.orderbook_snapshot = None  # 当前盘口前 DEPTH_LEVEL 档视图
+        # 价位存活时间跟踪（买盘键为价格，卖盘键为价格取负）
+        self.level_tracker = LevelLifetimeTracker(LEVEL_IDLE_MS, ORDER_LIFETIME_MS)
+
+        # 多档订单流与加权深度 (wb, wa, total)
+        self.mlofi = MultiLevelOfi(DEPTH_LEVEL)
+        self.depth_stats = (0.0, 0.0, 0.0)
+
+        # 滚动窗口累计：成交买卖量、盘口增减量 (bid_add, bid_rem, ask_add, ask_rem)
+        self.tfi_window = RollingWindowSum(self.trades_buffer, WINDOW * 1000, _trade_sums)
+        self.ofi_window = RollingWindowSum(self.book_changes, OFI_WINDOW_MS, _book_change_sums)
+        self.refill_window = RollingWindowSum(self.book_changes, WINDOW * 1000, _book_change_sums)
         self.signals = deque(maxlen=1200)  # 信号记录
+        self.signal_sink = None  # 可选的列式信号存储（okx_signal_store.SignalStore）
 
         # 指标相关
+        self.ema1_state = TimeEma(EMA1_SEC * 1000)
+        self.ema2_state = TimeEma(EMA2_SEC * 1000)
         self.ema1 = None
         self.ema2 = None
-        self.vwap_num = 0.0
-        self.vwap_den = 0.0
+        self.vwap = VwapEngine(VWAP_WINDOWS_MS, VWAP_BUCKET_MS)  # 多窗口 VWAP
         self.last_calc_ms = 0
+        self.last_event_ts = None  # 最近一条盘口/成交的交易所时间戳（毫秒）
         self.last_signal_ms = 0
+        self.dirty = False  # 上次计算后是否有新数据
+        self.version = 0  # 数据版本号，每处理一条盘口/成交 +1
+        self._features = None  # 特征快照缓存
+        self._features_key = None  # (数据版本号, 计算时间)
+        self.wakeup = asyncio.Event()  # 有新数据时唤醒计算任务
         self.position_bias = 0  # 当前持仓方向
 
+    def reset_book(self):
+        """连接重建时作废订单簿，等待新的快照"""
+        self.book.reset()
+        self.mlofi.reset()
+        self.need_resync = False
+        self.orderbook_snapshot = None
+
+    def mark_dirty(self):
+        """标记有新数据并唤醒计算任务"""
+        self.dirty = True
+        self.wakeup.set()
+
     def update_mid_and_trend(self):
         """更新中间价和EMA趋势"""
         if not self.orderbook_snapshot: return
@@ -84,139 +149,143 @@ class SymbolContext:
         best_bid = float(bids[0][0])
         best_ask = float(asks[0][0])
         mid = (best_bid + best_ask) / 2.0
-        self.mid_buffer.append((now_ms(), mid))
+        ts = self.clock()
+        self.mid_series.update(ts, mid)
+        # EMA 按时间衰减，繁忙与冷清的合约含义一致
+        self.ema1 = self.ema1_state.update(ts, mid)
+        self.ema2 = self.ema2_state.update(ts, mid)
 
-        def ema_update(prev, x, alpha):
-            return x if prev is None else (alpha * x + (1 - alpha) * prev)
+    def update_vwap_on_trade(self, ts, price, size):
+        """成交时更新各窗口VWAP"""
+        self.vwap.add(ts, price, size)
 
-        alpha1 = 2 / (EMA1_SEC + 1)
-        alpha2 = 2 / (EMA2_SEC + 1)
-        self.ema1 = ema_update(self.ema1, mid, alpha1)
-        self.ema2 = ema_update(self.ema2, mid, alpha2)
-
-    def update_vwap_on_trade(self, trade):
-        """成交时更新VWAP分子分母"""
-        price = float(trade["px"])
-        size = float(trade["sz"])
-        self.vwap_num += price * size
-        self.vwap_den += size
-
-    def get_vwap(self):
-        """返回当前VWAP"""
-        return (self.vwap_num / self.vwap_den) if self.vwap_den > 0 else None
+    def get_vwap(self, window=VWAP_GATE_WINDOW):
+        """返回指定窗口的当前VWAP（"5m" / "1h" / "session" 等）"""
+        return self.vwap.get(window, self.clock())
 
     def get_volatility_bps(self, lookback_ms=60_000):
-        """计算波动率（基点）"""
-        cutoff = now_ms() - lookback_ms
-        arr = [p for ts, p in self.mid_buffer if ts >= cutoff]
-        if len(arr) < 10:
+        """计算波动率（基点），基于分桶中间价序列 O(1) 查询"""
+        self.mid_series.advance(self.clock())
+        mu, sd, n = self.mid_series.mean_std(lookback_ms)
+        if n < 10:
             return VOL_LOW_BPS
-        mu = np.mean(arr)
-        sd = np.std(arr)
         return 0 if mu == 0 else (sd / mu) * 10_000
 
-    def process_orderbook_delta(self, data0):
+    def process_orderbook_delta(self, data0, action="snapshot"):
         """
-        处理盘口增量数据，更新盘口快照和增减量缓存
+        处理原始盘口推送（snapshot / update）
+        :param data0: 推送中的 data[0]
+        :param action: 推送类型，books 频道为 snapshot / update
+        :return: False 表示未应用（等待快照或出现缺口），见 process_book_update
         """
-        ts = now_ms()
-        bids_raw = data0["bids"][:DEPTH_LEVEL]
-        asks_raw = data0["asks"][:DEPTH_LEVEL]
-
-        bids = [(float(p), float(sz)) for p, sz, *_ in bids_raw]
-        asks = [(float(p), float(sz)) for p, sz, *_ in asks_raw]
+        return self.process_book_update(parse_book(data0, action, self.symbol))
 
-        def filter_orders(orders):
+    def process_book_update(self, update):
+        """
+        处理已解析的盘口推送，维护增量订单簿并更新前 DEPTH_LEVEL 档视图和增减量缓存
+        :param update: okx_decoder.BookUpdate
+        :return: False 表示未应用：等待快照期间的增量被丢弃，或出现序列缺口/校验失败（此时置 need_resync）
+        """
+        if update.action != "snapshot" and not self.book.ready:
+            # 缺口后、重新订阅的快照到达前仍在途的增量，不是新的缺口，直接丢弃
+            return False
+        ts = self.clock()
+        self.version += 1
+        if not self.book.apply_update(update):
+            # 订单簿已失效，停止基于旧盘口计算，等待重新订阅后的快照
+            logger.warning(f"{self.symbol} orderbook out of sync (seqId/checksum), resync #{self.book.resync_count}")
+            self.need_resync = True
+            self.orderbook_snapshot = None
+            self.mlofi.reset()
+            return False
+
+        bids = self.book.top_bids(DEPTH_LEVEL)
+        asks = self.book.top_asks(DEPTH_LEVEL)
+
+        tracker = self.level_tracker
+        tracker.advance(ts)
+
+        def filter_orders(orders, sign):
             out = []
             for p, sz in orders:
-                if sz > 0:
-                    if p not in self.last_order_seen:
-                        self.last_order_seen[p] = ts
-                    elif ts - self.last_order_seen[p] < ORDER_LIFETIME_MS:
-                        sz *= 0.3
-                else:
-                    self.last_order_seen.pop(p, None)
+                # 新出现不久的价位（可能是闪单）降低权重
+                age = tracker.touch(sign * p, ts)
+                if age is not None and age < ORDER_LIFETIME_MS:
+                    sz *= 0.3
                 out.append((p, sz))
             return out
 
-        filtered_bids = filter_orders(bids)
-        filtered_asks = filter_orders(asks)
-
-        prev_b_dict = {p: s for p, s in self.prev_orderbook_snapshot["bids"]} if self.prev_orderbook_snapshot else {}
-        prev_a_dict = {p: s for p, s in self.prev_orderbook_snapshot["asks"]} if self.prev_orderbook_snapshot else {}
-        new_b_dict = {p: s for p, s in filtered_bids}
-        new_a_dict = {p: s for p, s in filtered_asks}
-
-        def level_weights(side_prices):
-            if not side_prices: return {}
-            weights = {}
-            for i, (p, _) in enumerate(side_prices):
-                w = 0.9 ** i
-                weights[p] = w
-            return weights
-
-        wb = level_weights(filtered_bids)
-        wa = level_weights(filtered_asks)
-
-        # 记录盘口增减量
-        for p in set(new_b_dict) | set(prev_b_dict):
-            d = new_b_dict.get(p, 0.0) - prev_b_dict.get(p, 0.0)
-            if d > 0:
-                self.bid_added.append((ts, d * wb.get(p, 0.2)))
-            elif d < 0:
-                self.bid_removed.append((ts, -d * wb.get(p, 0.2)))
-
-        for p in set(new_a_dict) | set(prev_a_dict):
-            d = new_a_dict.get(p, 0.0) - prev_a_dict.get(p, 0.0)
-            if d > 0:
-                self.ask_added.append((ts, d * wa.get(p, 0.2)))
-            elif d < 0:
-                self.ask_removed.append((ts, -d * wa.get(p, 0.2)))
-
-        self.prev_orderbook_snapshot = copy.deepcopy(self.orderbook_snapshot) if self.orderbook_snapshot else None
+        filtered_bids = filter_orders(bids, 1)
+        filtered_asks = filter_orders(asks, -1)
+
+        # 逐档订单流（MLOFI），正值计为挂单增加，负值计为撤单/成交
+        bid_flow, ask_flow, bid_sz, ask_sz = self.mlofi.update(filtered_bids, filtered_asks)
+        weights = self.mlofi.weights
+        wb = float(weights @ bid_sz)
+        wa = float(weights @ ask_sz)
+        self.depth_stats = (wb, wa, wb + wa)
+        bid_add = float(bid_flow[bid_flow > 0].sum())
+        bid_rem = -float(bid_flow[bid_flow < 0].sum())
+        ask_add = float(ask_flow[ask_flow > 0].sum())
+        ask_rem = -float(ask_flow[ask_flow < 0].sum())
+
+        # 按消息聚合后写入滚动窗口
+        if bid_add or bid_rem or ask_add or ask_rem:
+            self.book_changes.append(ts, bid_add, bid_rem, ask_add, ask_rem)
+            self.ofi_window.add(bid_add, bid_rem, ask_add, ask_rem)
+            self.refill_window.add(bid_add, bid_rem, ask_add, ask_rem)
+
         self.orderbook_snapshot = {"bids": filtered_bids, "asks": filtered_asks}
 
         self.update_mid_and_trend()
+        return True
 
     def process_trade_entry(self, trade):
-        """处理成交数据，更新成交缓存和VWAP"""
-        ts = int(trade["ts"])
-        price = float(trade["px"])
-        size = float(trade["sz"])
-        side = trade["side"]
-        self.trades_buffer.append((ts, price, size, side))
-        self.update_vwap_on_trade(trade)
+        """处理原始成交数据"""
+        self.process_trade(parse_trade(trade, self.symbol))
+
+    def process_trade(self, trade):
+        """处理已解析的成交（okx_decoder.Trade），更新成交缓存和VWAP"""
+        price, size = trade.px, trade.sz
+        self.version += 1
+        self.trades_buffer.append(trade.ts, price, size, trade.side)
+        if trade.side > 0:
+            self.tfi_window.add(size, 0.0)
+        else:
+            self.tfi_window.add(0.0, size)
+        self.update_vwap_on_trade(trade.ts, price, size)
 
     # -------------------------
     # 各类指标计算
     # -------------------------
-    def compute_obi(self):
-        """订单簿不平衡指标"""
+    def book_volumes(self):
+        """当前盘口前 DEPTH_LEVEL 档买卖挂单量合计 (bid_vol, ask_vol)"""
         bid_vol = sum(sz for _, sz in self.orderbook_snapshot["bids"])
         ask_vol = sum(sz for _, sz in self.orderbook_snapshot["asks"])
+        return bid_vol, ask_vol
+
+    def compute_obi(self, bid_vol=None, ask_vol=None):
+        """
+        订单簿不平衡指标
+        :param bid_vol: 已计算的买盘挂单量，与 ask_vol 均不传则重新计算
+        """
+        if bid_vol is None or ask_vol is None:
+            bid_vol, ask_vol = self.book_volumes()
         return (bid_vol - ask_vol) / (bid_vol + ask_vol + 1e-9)
 
-    def compute_tfi(self):
-        """成交流入指标"""
-        cutoff = now_ms() - WINDOW * 1000
-        buys = sells = 0.0
-        for ts, _, size, side in reversed(self.trades_buffer):
-            if ts < cutoff:
-                break
-            if side == "buy":
-                buys += size
-            else:
-                sells += size
+    def compute_tfi(self, buys=None, sells=None):
+        """
+        成交流入指标
+        :param buys: 已读取的窗口主动买量，与 sells 均不传则从窗口读取
+        """
+        if buys is None or sells is None:
+            buys, sells = self.tfi_window.get(self.clock())
         total = buys + sells
         return (buys - sells) / total if total else 0.0
 
     def compute_ofi(self):
         """订单流指标"""
-        cutoff = now_ms() - OFI_WINDOW_MS
-        bid_add = sum(sz for ts, sz in self.bid_added if ts >= cutoff)
-        bid_rem = sum(sz for ts, sz in self.bid_removed if ts >= cutoff)
-        ask_add = sum(sz for ts, sz in self.ask_added if ts >= cutoff)
-        ask_rem = sum(sz for ts, sz in self.ask_removed if ts >= cutoff)
+        bid_add, bid_rem, ask_add, ask_rem = self.ofi_window.get(self.clock())
         net = (bid_add - bid_rem) - (ask_add - ask_rem)
         total_change = (bid_add + bid_rem + ask_add + ask_rem) + 1e-9
         cancel_ratio = (bid_rem + ask_rem) / total_change
@@ -226,64 +295,64 @@ class SymbolContext:
 
     def compute_refill_ratio(self):
         """盘口补单比率"""
-        cutoff = now_ms() - WINDOW * 1000
-        ask_add = sum(sz for ts, sz in self.ask_added if ts >= cutoff)
-        ask_rem = sum(sz for ts, sz in self.ask_removed if ts >= cutoff)
-        bid_add = sum(sz for ts, sz in self.bid_added if ts >= cutoff)
-        bid_rem = sum(sz for ts, sz in self.bid_removed if ts >= cutoff)
+        bid_add, bid_rem, ask_add, ask_rem = self.refill_window.get(self.clock())
         refill_ask = ask_add / (ask_rem + 1e-9)
         refill_bid = bid_add / (bid_rem + 1e-9)
         return refill_bid, refill_ask
 
     def compute_uptick_ratio(self):
         """成交价上行比率"""
-        cutoff = now_ms() - WINDOW * 1000
-        upticks = downticks = 0
-        trades = [t for t in self.trades_buffer if t[0] >= cutoff]
-        for i in range(1, len(trades)):
-            _, p0, _, _ = trades[i - 1]
-            _, p1, _, side = trades[i]
-            if side == "buy" and p1 > p0:
-                upticks += 1
-            elif side == "sell" and p1 < p0:
-                downticks += 1
+        trades = self.tfi_window.rows(self.clock())
+        if len(trades) < 2:
+            return 0.5
+        dp = np.diff(trades["px"])
+        side = trades["side"][1:]
+        upticks = int(np.count_nonzero((side > 0) & (dp > 0)))
+        downticks = int(np.count_nonzero((side < 0) & (dp < 0)))
         total = upticks + downticks
         return upticks / total if total else 0.5
 
-    def detect_sweep(self):
-        """检测大单扫单"""
-        if not self.trades_buffer or not self.orderbook_snapshot:
+    def detect_sweep(self, total_bid=None, total_ask=None):
+        """
+        检测大单扫单
+        :param total_bid: 已计算的买盘挂单量，与 total_ask 均不传则重新计算
+        """
+        if not len(self.trades_buffer) or not self.orderbook_snapshot:
             return 0
-        _, _, size, side = self.trades_buffer[-1]
-        total_bid = sum(sz for _, sz in self.orderbook_snapshot["bids"])
-        total_ask = sum(sz for _, sz in self.orderbook_snapshot["asks"])
-        if size > 0.5 * total_bid and side == "sell":
+        last = self.trades_buffer[-1]
+        size, side = float(last["sz"]), int(last["side"])
+        if total_bid is None or total_ask is None:
+            total_bid, total_ask = self.book_volumes()
+        if size > 0.5 * total_bid and side < 0:
             return -1
-        if size > 0.5 * total_ask and side == "buy":
+        if size > 0.5 * total_ask and side > 0:
             return 1
         return 0
 
     def detect_volume_spike(self):
         """检测成交量突增"""
-        vols = [sz for _, _, sz, _ in self.trades_buffer]
-        if len(vols) < 20:
+        if len(self.trades_buffer) < 20:
             return 0.0
-        avg_vol = np.mean(vols[-20:])
+        vols = self.trades_buffer.last(20)["sz"]
+        avg_vol = vols.mean()
         latest_vol = vols[-1]
         return latest_vol / (avg_vol + 1e-9)
 
     def get_depth_stats(self):
-        """盘口加权深度统计"""
+        """盘口加权深度统计 (wb, wa, total)，随盘口更新以向量运算维护"""
         if not self.orderbook_snapshot: return 0.0, 0.0, 0.0
-        wb = sum(sz * (0.9 ** i) for i, (_, sz) in enumerate(self.orderbook_snapshot["bids"]))
-        wa = sum(sz * (0.9 ** i) for i, (_, sz) in enumerate(self.orderbook_snapshot["asks"]))
-        total = wb + wa
-        return wb, wa, total
-
-    def get_dynamic_weights(self):
-        """根据波动率和深度动态调整各因子权重"""
-        vol_bps = self.get_volatility_bps()
-        _, _, depth_total = self.get_depth_stats()
+        return self.depth_stats
+
+    def get_dynamic_weights(self, vol_bps=None, depth_total=None):
+        """
+        根据波动率和深度动态调整各因子权重
+        :param vol_bps: 已计算的波动率，不传则重新计算
+        :param depth_total: 已计算的加权深度，不传则重新计算
+        """
+        if vol_bps is None:
+            vol_bps = self.get_volatility_bps()
+        if depth_total is None:
+            _, _, depth_total = self.get_depth_stats()
         if vol_bps <= VOL_LOW_BPS:
             w_trend = 0.35
             w_book = 0.5
@@ -302,14 +371,20 @@ class SymbolContext:
             w_trend, w_book, w_trade = w_trend / s, w_book / s, w_trade / s
         return w_trend, w_book, w_trade
 
-    def trend_gate(self):
-        """趋势门控，判断EMA趋势和VWAP偏离"""
+    def trend_gate(self, vwap_window=VWAP_GATE_WINDOW, vwap=None, last_mid=None):
+        """
+        趋势门控，判断EMA趋势和指定窗口的VWAP偏离
+        :param vwap: 已查询的 vwap_window 窗口 VWAP，不传则重新查询
+        :param last_mid: 已计算的中间价，不传则取中间价序列的最新值
+        """
         if self.ema1 is None or self.ema2 is None:
             return 0
         slope = 1 if self.ema1 > self.ema2 else (-1 if self.ema1 < self.ema2 else 0)
-        vwap = self.get_vwap()
+        if vwap is None:
+            vwap = self.get_vwap(vwap_window)
         if vwap:
-            last_mid = self.mid_buffer[-1][1] if self.mid_buffer else None
+            if last_mid is None:
+                last_mid = self.mid_series.last_mid
             if last_mid:
                 dev = (last_mid - vwap) / vwap
                 if slope > 0 and dev > 0.01:
@@ -318,61 +393,114 @@ class SymbolContext:
                     slope = min(0, slope)
         return slope
 
-    def compute_scores(self):
+    def compute_features(self):
         """
-        综合计算各类指标，输出最终信号分数
+        计算本次的全部基础特征，每个量只计算一次
+        同一数据版本、同一时刻重复调用直接返回缓存
+        :return: FeatureSnapshot；尚无盘口时返回 None
         """
-        logger.info(f"Computing scores...:-)")
-        if not self.orderbook_snapshot or len(self.trades_buffer) < MIN_VOL_SAMPLES:
+        if not self.orderbook_snapshot:
             return None
+        now = self.clock()
+        key = (self.version, now)
+        if key == self._features_key:
+            return self._features
+
+        bids = self.orderbook_snapshot["bids"]
+        asks = self.orderbook_snapshot["asks"]
+        bid_vol, ask_vol = self.book_volumes()
         wb, wa, depth = self.get_depth_stats()
+        buy_vol, sell_vol = self.tfi_window.get(now)
+
+        refill_bid, refill_ask = self.compute_refill_ratio()
+        _, median_rest_ms, flicker_rate = self.level_tracker.stats()
+        best_bid = bids[0][0] if bids else None
+        best_ask = asks[0][0] if asks else None
+        snapshot = FeatureSnapshot(
+            ts=now,
+            best_bid=best_bid,
+            best_ask=best_ask,
+            mid=(best_bid + best_ask) / 2.0 if bids and asks else None,
+            bid_vol=bid_vol,
+            ask_vol=ask_vol,
+            depth_bid=wb,
+            depth_ask=wa,
+            depth=depth,
+            obi=self.compute_obi(bid_vol, ask_vol),
+            tfi=self.compute_tfi(buy_vol, sell_vol),
+            buy_vol=buy_vol,
+            sell_vol=sell_vol,
+            uptick_ratio=self.compute_uptick_ratio(),
+            sweep=self.detect_sweep(bid_vol, ask_vol),
+            ofi_raw=self.compute_ofi(),
+            refill_bid=refill_bid,
+            refill_ask=refill_ask,
+            vol_spike=float(self.detect_volume_spike()),
+            vol_bps=float(self.get_volatility_bps()),
+            ema1=self.ema1,
+            ema2=self.ema2,
+            vwap=self.get_vwap(),
+            n_trades=len(self.trades_buffer),
+            median_rest_ms=median_rest_ms,
+            flicker_rate=flicker_rate,
+        )
+        self._features = snapshot
+        self._features_key = key
+        return snapshot
+
+    def compute_scores(self):
+        """
+        基于特征快照综合计算各类指标，输出最终信号分数
+        """
+        logger.info(f"Computing scores...:-)", extra={"rate_key": self.symbol})
+        f = self.compute_features()
+        if f is None or f.n_trades < MIN_VOL_SAMPLES:
+            return None
+        depth = f.depth
         if depth < DEPTH_MIN:
-            logger.info(f"{self.symbol} Depth too shallow, skipping signal. wb: {wb} wa: {wa} "
-                        f"Depth: {depth:.1f}")
+            logger.info(f"{self.symbol} Depth too shallow, skipping signal. wb: {f.depth_bid} wa: {f.depth_ask} "
+                        f"Depth: {depth:.1f}", extra={"rate_key": self.symbol})
             return None
-        tfi = self.compute_tfi()
-        uptick = 2 * (self.compute_uptick_ratio() - 0.5)
-        sweep = self.detect_sweep()
-        trend_score = np.clip(np.mean([tfi, uptick, sweep]), -1, 1)
-        obi = self.compute_obi()
-        ofi_raw = self.compute_ofi()
-        ofi = np.tanh(ofi_raw / max(depth, 1.0))
-        refill_bid, refill_ask = self.compute_refill_ratio()
-        refill_score = np.tanh(refill_bid - refill_ask)
-        orderbook_score = np.clip(np.mean([obi, ofi, refill_score]), -1, 1)
-        vol_spike = self.detect_volume_spike()
-        trade_score = np.tanh(vol_spike - VOLUME_SPIKE_FACTOR)
-        w_trend, w_book, w_trade = self.get_dynamic_weights()
+        tfi = f.tfi
+        uptick = 2 * (f.uptick_ratio - 0.5)
+        sweep = f.sweep
+        trend_score = np.clip((tfi + uptick + sweep) / 3, -1, 1)
+        obi = f.obi
+        ofi = np.tanh(f.ofi_raw / max(depth, 1.0))
+        refill_score = np.tanh(f.refill_bid - f.refill_ask)
+        orderbook_score = np.clip((obi + ofi + refill_score) / 3, -1, 1)
+        trade_score = np.tanh(f.vol_spike - VOLUME_SPIKE_FACTOR)
+        w_trend, w_book, w_trade = self.get_dynamic_weights(f.vol_bps, depth)
         final_raw = w_trend * trend_score + w_book * orderbook_score + w_trade * trade_score
-        gate = self.trend_gate()
-        est_edge_bps = abs(final_raw) * max(self.get_volatility_bps(), 1)
+        gate = self.trend_gate(vwap=f.vwap, last_mid=f.mid)
+        est_edge_bps = abs(final_raw) * max(f.vol_bps, 1)
         if gate == 0 or est_edge_bps < EDGE_BPS:
             final_raw *= 0.3
         final_score = int((np.clip(final_raw, -1, 1) + 1) * 50)
         self.signals.append({
-            "timestamp": now_ms(),
+            "timestamp": f.ts,
             "obi": float(obi),
             "tfi": float(tfi),
             "uptick": float(uptick),
             "sweep": int(sweep),
             "ofi": float(ofi),
-            "refill_bid": float(refill_bid),
-            "refill_ask": float(refill_ask),
-            "vol_spike": float(vol_spike),
-            "ema1": float(self.ema1) if self.ema1 else None,
-            "ema2": float(self.ema2) if self.ema2 else None,
+            "refill_bid": float(f.refill_bid),
+            "refill_ask": float(f.refill_ask),
+            "vol_spike": f.vol_spike,
+            "vol_bps": f.vol_bps,
+            "ema1": float(f.ema1) if f.ema1 else None,
+            "ema2": float(f.ema2) if f.ema2 else None,
             "gate": int(gate),
             "depth": float(depth),
             "est_edge_bps": float(est_edge_bps),
+            "median_rest_ms": f.median_rest_ms,
+            "flicker_rate": f.flicker_rate,
         })
-        logger.info(f"[{self.symbol}] Trend({trend_score:.3f}) Book({orderbook_score:.3f}) "
-                    f"Trade({trade_score:.3f}) | Gate:{gate} Vol:{self.get_volatility_bps():.1f}bps "
-                    f"Depth:{depth:.1f} | Edge:{est_edge_bps:.2f}bps Final:{final_score}")
-        signal_logger.info(
-            f"[{self.symbol}] Trend({trend_score:.3f}) Book({orderbook_score:.3f}) "
-            f"Trade({trade_score:.3f}) | Gate:{gate} Vol:{self.get_volatility_bps():.1f}bps "
-            f"Depth:{depth:.1f} | Edge:{est_edge_bps:.2f}bps Final:{final_score}"
-        )
+        score_line = (f"[{self.symbol}] Trend({trend_score:.3f}) Book({orderbook_score:.3f}) "
+                      f"Trade({trade_score:.3f}) | Gate:{gate} Vol:{f.vol_bps:.1f}bps "
+                      f"Depth:{depth:.1f} | Edge:{est_edge_bps:.2f}bps Final:{final_score}")
+        logger.info(score_line, extra={"rate_key": self.symbol})
+        signal_logger.info(score_line)
         return {
             "trend": round(trend_score, 3),
             "orderbook": round(orderbook_score, 3),
@@ -384,86 +512,169 @@ class SymbolContext:
         }
 
 
+def _trade_sums(rows):
+    """成交窗口合计：(主动买量, 主动卖量)"""
+    sz = rows["sz"]
+    buy = rows["side"] > 0
+    return sz[buy].sum(), sz[~buy].sum()
+
+
+def _book_change_sums(rows):
+    """盘口增减量窗口合计：(bid_add, bid_rem, ask_add, ask_rem)"""
+    return rows["bid_add"].sum(), rows["bid_rem"].sum(), rows["ask_add"].sum(), rows["ask_rem"].sum()
+
+
 # -----------------------------
 # 主逻辑
 # -----------------------------
-async def run_symbol(ws, symbol):
+def recompute_and_decide(ctx, now):
+    """
+    计算一次信号分数，并完成多空信号判定与持仓切换
+    :return: (scores, action)，scores 为 None 时 action 为 "HOLD"
+    """
+    with metrics.timed(ctx.symbol, "score"):
+        scores = ctx.compute_scores()
+    ctx.last_calc_ms = now
+    action = "HOLD"
+    if not scores:
+        return scores, action
+    # 决策所依据的最新行情已超出延迟预算时标记为过期信号
+    scores["stale"] = ctx.last_event_ts is not None and metrics.check_age(ctx.symbol, now - ctx.last_event_ts,
+                                                                          STALE_SIGNAL_MS)
+    f = scores["final"]
+    gate = scores["gate"]
+    # 多空信号判定与持仓切换
+    logger.info(f"[{ctx.symbol}] Position bias: {ctx.position_bias}, Gate: {gate}, Score: {f}"
+                f", Last signal at: {ctx.last_signal_ms} ms, now {now} ms, cooldown {COOLDOWN_MS} ms",
+                extra={"rate_key": ctx.symbol})
+    if ctx.position_bias >= 0 and gate >= 0:
+        if f >= ENTER_LONG and (now - ctx.last_signal_ms) >= COOLDOWN_MS:
+            if ctx.position_bias <= 0:
+                action = "ENTER_LONG"
+                ctx.position_bias = +1
+                ctx.last_signal_ms = now
+        elif f <= EXIT_LONG and ctx.position_bias == +1:
+            action = "EXIT_LONG"
+            ctx.position_bias = 0
+            ctx.last_signal_ms = now
+    if ctx.position_bias <= 0 and gate <= 0:
+        if f <= ENTER_SHORT and (now - ctx.last_signal_ms) >= COOLDOWN_MS:
+            if ctx.position_bias >= 0:
+                action = "ENTER_SHORT"
+                ctx.position_bias = -1
+                ctx.last_signal_ms = now
+        elif f >= EXIT_SHORT and ctx.position_bias == -1:
+            action = "EXIT_SHORT"
+            ctx.position_bias = 0
+            ctx.last_signal_ms = now
+
+    if ctx.signal_sink is not None:
+        ctx.signal_sink.record(ctx.symbol, ctx.signals[-1], scores, action, ctx.position_bias)
+    if action != "HOLD":
+        signal_logger.info(
+            f"[{ctx.symbol}] {action} | score={f} gate={gate} "
+            f"edge={scores['edge_bps']}bps depth={int(scores['depth'])}"
+            f"{' STALE' if scores['stale'] else ''}"
+        )
+    return scores, action
+
+
+def handle_message(ctx, msg):
+    """处理一条已按合约路由的盘口/成交推送，每个字段只解析一次"""
+    ch, _, payload = decode_message(msg)
+    if payload is None:
+        return
+    if ch == "books":
+        ctx.process_book_update(payload)
+        ts = payload.ts
+    else:
+        for t in payload:
+            ctx.process_trade(t)
+        ts = payload[-1].ts
+    if ts:
+        ctx.last_event_ts = ts
+        metrics.observe(ctx.symbol, "exchange_to_ingest", (ctx.clock() - ts) * 1000)
+    ctx.mark_dirty()
+
+
+async def run_symbol(feed, ctx, on_result=None):
     """
-    单合约主循环，订阅盘口和成交，实时计算信号
+    单合约主循环，基于共享连接推送的数据实时计算信号
+    - EVENT_DRIVEN 模式：推送到达时唤醒，节流窗口内的多次推送合并为一次计算，无新数据时不计算
+    - 轮询模式：每 20ms 检查一次，按 RECALC_THROTTLE_MS 节流计算
+    - 连接断开或 books 停推（feed.is_stale）期间不计算、不发信号，由 feed.supervise 负责重连和重建订单簿
+    :param on_result: 可选回调 on_result(ctx, scores, action)，每次得到有效分数后调用
     """
-    ctx = SymbolContext(symbol)
-
-    def callback0(raw):
-        """WebSocket回调，处理盘口和成交推送"""
-        try:
-            msg = json.loads(raw)
-        except Exception:
-            return
-        if "arg" not in msg: return
-        ch = msg["arg"].get("channel", "")
-        if ch.startswith("books") and "data" in msg:
-            ctx.process_orderbook_delta(msg["data"][0])
-        elif ch == "trades" and "data" in msg:
-            for t in msg["data"]:
-                ctx.process_trade_entry(t)
-
-    args = [
-        {"channel": "books", "instId": symbol},
-        {"channel": "trades", "instId": symbol}
-    ]
-    await ws.subscribe(args, callback=callback0)
     while True:
-        now = now_ms()
-        # 节流计算信号
-        if now - ctx.last_calc_ms >= RECALC_THROTTLE_MS:
-            scores = ctx.compute_scores()
-            ctx.last_calc_ms = now
-            if scores:
-                f = scores["final"]
-                gate = scores["gate"]
-                action = "HOLD"
-                # 多空信号判定与持仓切换
-                logger.info(f"Position bias: {ctx.position_bias}, Gate: {gate}, Score: {f}"
-                            f", Last signal at: {ctx.last_signal_ms} ms, now {now} ms, cooldown {COOLDOWN_MS} ms")
-                if ctx.position_bias >= 0 and gate >= 0:
-                    if f >= ENTER_LONG and (now - ctx.last_signal_ms) >= COOLDOWN_MS:
-                        if ctx.position_bias <= 0:
-                            action = "ENTER_LONG"
-                            ctx.position_bias = +1
-                            ctx.last_signal_ms = now
-                    elif f <= EXIT_LONG and ctx.position_bias == +1:
-                        action = "EXIT_LONG"
-                        ctx.position_bias = 0
-                        ctx.last_signal_ms = now
-                if ctx.position_bias <= 0 and gate <= 0:
-                    if f <= ENTER_SHORT and (now - ctx.last_signal_ms) >= COOLDOWN_MS:
-                        if ctx.position_bias >= 0:
-                            action = "ENTER_SHORT"
-                            ctx.position_bias = -1
-                            ctx.last_signal_ms = now
-                    elif f >= EXIT_SHORT and ctx.position_bias == -1:
-                        action = "EXIT_SHORT"
-                        ctx.position_bias = 0
-                        ctx.last_signal_ms = now
-
-                if action != "HOLD":
-                    signal_logger.info(
-                        f"[{symbol}] {action} | score={f} gate={gate} "
-                        f"edge={scores['edge_bps']}bps depth={int(scores['depth'])}"
-                    )
-        await asyncio.sleep(0.02)
+        if ctx.need_resync:
+            # 重新订阅 books 频道，服务端会重新推送全量快照
+            ctx.need_resync = False
+            await feed.resubscribe(ctx.symbol, "books")
+        if EVENT_DRIVEN:
+            await ctx.wakeup.wait()
+            # 距上次计算不足节流间隔时等待剩余时间，期间到达的推送合并为一次计算
+            wait_ms = RECALC_THROTTLE_MS - (ctx.clock() - ctx.last_calc_ms)
+            if wait_ms > 0:
+                await asyncio.sleep(wait_ms / 1000)
+            ctx.wakeup.clear()
+            if not ctx.dirty:
+                continue
+            ctx.dirty = False
+            if feed.is_stale(ctx.symbol):
+                continue
+            scores, action = recompute_and_decide(ctx, ctx.clock())
+        else:
+            now = ctx.clock()
+            # 节流计算信号
+            scores = None
+            if now - ctx.last_calc_ms >= RECALC_THROTTLE_MS and not feed.is_stale(ctx.symbol):
+                scores, action = recompute_and_decide(ctx, now)
+            await asyncio.sleep(0.02)
+        if scores and on_result is not None:
+            on_result(ctx, scores, action)
 
 
 async def main():
     """
-    启动所有合约的信号计算任务
+    启动所有合约的信号计算任务，所有合约共享 WS_POOL_SIZE 条公共连接
     """
-    tasks = []
-    for sym in TREND_SYMBOL_LIST:
-        ws = WsPublicAsync(url=WS_URL)
-        await ws.start()
-        tasks.append(asyncio.create_task(run_symbol(ws, sym)))
-    await asyncio.gather(*tasks)
+    contexts = {sym: SymbolContext(sym) for sym in TREND_SYMBOL_LIST}
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
+        metrics.gauge("log_queue", queue_size)
+        metrics.gauge("dirty_symbols", lambda: sum(ctx.dirty for ctx in contexts.values()))
+    if WARM_START:
+        await bootstrap(contexts.values())
+
+    def route(inst_id, msg):
+        ctx = contexts.get(inst_id)
+        if ctx is not None:
+            handle_message(ctx, msg)
+
+    def reset(inst_ids):
+        for inst_id in inst_ids:
+            contexts[inst_id].reset_book()
+
+    recorder = FrameRecorder(RECORD_PATH) if RECORD_PATH else None
+    store = SignalStore(SIGNAL_STORE_DIR) if SIGNAL_STORE_DIR else None
+    for ctx in contexts.values():
+        ctx.signal_sink = store
+    if store is not None:
+        metrics.gauge("signal_store_pending", store.pending)
+    if recorder is not None:
+        metrics.gauge("recorder_pending", recorder.pending)
+    feed = OkxPublicFeed(WS_URL, list(contexts), route, pool_size=WS_POOL_SIZE, on_reset=reset,
+                         recorder=recorder)
+    await feed.start()
+    tasks = [asyncio.create_task(run_symbol(feed, ctx)) for ctx in contexts.values()]
+    tasks.append(asyncio.create_task(feed.supervise()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if store is not None:
+            store.close()
 
 
 if __name__ == "__main__":
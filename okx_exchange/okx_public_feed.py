@@ -0,0 +1,264 @@
+import asyncio
+import functools
+import random
+import time
+
+from okx.websocket.WsPublicAsync import WsPublicAsync
+
+from okx_exchange.okx_decoder import loads
+from utils.latency import metrics
+from utils.logging_setup import setup_logger
+
+RECONNECT_BASE_SEC = 0.5  # 重连初始退避（秒）
+RECONNECT_MAX_SEC = 30.0  # 重连最大退避（秒）
+SUPERVISE_INTERVAL_SEC = 1.0  # 连接巡检间隔（秒）
+HEARTBEAT_SEC = 5.0  # 连接空闲超过该时长发送 ping（秒）
+CONN_STALL_MS = 15_000  # 连接无任何帧（含 pong）超过该时长视为假死，立即重连（毫秒）
+BOOK_STALL_MS = 10_000  # 单合约 books 无推送超过该时长视为失效，重新订阅获取快照（毫秒）
+
+logger = setup_logger("okx_public_feed")
+
+
+class OkxPublicFeed:
+    """
+    多合约共享的 OKX 公共 WebSocket 连接池
+    - 合约按轮转方式分配到 pool_size 条连接上，每条连接订阅所分配合约的全部频道
+    - 推送统一解析后按 arg.instId 路由给 handler(inst_id, msg)
+    - 连接断开时集中重连（带抖动的指数退避）并重新订阅，重连前通过 on_reset(inst_ids) 通知上层作废旧状态
+    - 记录每条连接最后收帧时间和每个 (合约, 频道) 最后推送时间：连接空闲时发 ping，连接假死时重连，
+      单合约 books 停推时重新订阅并作废该合约订单簿；is_stale 供上层在行情失效期间屏蔽信号
+    """
+
+    def __init__(self, url, inst_ids, handler, channels=("books", "trades"), pool_size=1, on_reset=None,
+                 recorder=None, clock=None):
+        """
+        :param url: 公共频道地址
+        :param inst_ids: 合约列表
+        :param handler: 消息处理函数 handler(inst_id, msg)
+        :param channels: 每个合约订阅的频道
+        :param pool_size: 连接数
+        :param on_reset: 连接重建前回调 on_reset(inst_ids)
+        :param recorder: 可选的原始帧录制器（okx_recorder.FrameRecorder）
+        :param clock: 毫秒时钟，默认读取系统时间
+        """
+        self.url = url
+        self.handler = handler
+        self.channels = channels
+        self.on_reset = on_reset
+        self.recorder = recorder
+        pool_size = max(1, min(pool_size, len(inst_ids)))
+        self.shards = [list(inst_ids[i::pool_size]) for i in range(pool_size)]
+        self.inst_shard = {inst: i for i, shard in enumerate(self.shards) for inst in shard}
+        self.conns = [None] * pool_size
+        self.tasks = [None] * pool_size
+        self.reconnecting = [None] * pool_size  # 进行中的重连任务，重连期间巡检跳过该连接
+        self.callbacks = [functools.partial(self._callback, i) for i in range(pool_size)]
+        self.clock = clock or (lambda: int(time.time() * 1000))
+        self.last_frame_ms = [0] * pool_size  # 每条连接最后收帧时间（含 pong）
+        self.last_msg_ms = {}  # (inst_id, channel) -> 最后推送时间
+        self.resync_ms = {}  # inst_id -> 最近一次因停推重新订阅 books 的时间
+        self.reconnect_count = 0  # 重连次数（断线、假死、首次连接失败）
+        self.stall_count = 0  # 连接假死与单合约 books 停推次数
+        metrics.gauge(f"okx_public_feed[{self.shards[0][0]}]", self.stats)
+
+    def stats(self):
+        """连接池状态，注册为指标接口的 gauge"""
+        return {
+            "connections": len(self.conns),
+            "connected": sum(ws is not None for ws in self.conns),
+            "reconnecting": sum(t is not None and not t.done() for t in self.reconnecting),
+            "reconnects": self.reconnect_count,
+            "stalls": self.stall_count,
+        }
+
+    def _args(self, inst_ids, channels=None):
+        return [{"channel": ch, "instId": inst} for inst in inst_ids for ch in (channels or self.channels)]
+
+    def _callback(self, i, raw):
+        """第 i 条连接的回调：记录收帧时间，解析并按合约路由，分别统计解析和处理耗时"""
+        now = self.clock()
+        self.last_frame_ms[i] = now
+        if raw == "pong":
+            return
+        if self.recorder is not None:
+            self.recorder.record(raw)
+        t0 = time.perf_counter_ns()
+        try:
+            msg = loads(raw)
+        except Exception:
+            return
+        if "event" in msg:
+            if msg["event"] == "error":
+                logger.warning(f"OKX public ws error event: {msg}")
+            return
+        arg = msg.get("arg")
+        if not arg:
+            return
+        inst_id = arg.get("instId")
+        channel = arg.get("channel")
+        self.last_msg_ms[(inst_id, channel)] = now
+        t1 = time.perf_counter_ns()
+        self.handler(inst_id, msg)
+        metrics.observe_ns(inst_id, "decode", t1 - t0)
+        metrics.observe_ns(inst_id, "ingest", time.perf_counter_ns() - t1)
+        metrics.incr(inst_id, channel)
+
+    @staticmethod
+    async def _close(ws):
+        """
+        关闭底层连接；不调用 ws.stop()：python-okx 0.4.0 及更早版本的 stop() 会停止整个事件循环
+        """
+        factory = getattr(ws, "factory", None)
+        if factory is not None:
+            await factory.close()
+        elif ws.websocket is not None:
+            await ws.websocket.close()
+
+    @staticmethod
+    async def _watch(websocket):
+        """
+        连接存活任务：底层 socket 关闭时结束，供 supervise 判断断线
+        python-okx 0.4.2 起 start() 才返回消费任务，不依赖其返回值以兼容各版本
+        """
+        await websocket.wait_closed()
+
+    async def _connect(self, i):
+        ws = WsPublicAsync(url=self.url)
+        try:
+            await ws.start()
+            if ws.websocket is None:
+                raise ConnectionError(f"connect {self.url} failed")
+            await ws.subscribe(self._args(self.shards[i]), callback=self.callbacks[i])
+        except Exception:
+            # 半建立的连接不会登记到 conns，这里关闭以免泄漏
+            try:
+                await self._close(ws)
+            except Exception:
+                pass
+            raise
+        task = asyncio.create_task(self._watch(ws.websocket))
+        # 订阅时刻作为各频道的起始时间，首个推送迟迟不到同样按停推处理
+        now = self.clock()
+        self.last_frame_ms[i] = now
+        for inst in self.shards[i]:
+            for ch in self.channels:
+                self.last_msg_ms[(inst, ch)] = now
+        self.conns[i] = ws
+        self.tasks[i] = task
+        logger.info(f"OKX public ws #{i} subscribed {len(self.shards[i])} instruments")
+
+    async def start(self):
+        """建立全部连接并订阅，首次连接失败的走与断线相同的抖动退避重连"""
+
+        async def start_one(i):
+            try:
+                await self._connect(i)
+            except Exception as e:
+                logger.warning(f"connect OKX public ws #{i} failed: {e}, retrying")
+                await self.reconnect(i)
+
+        await asyncio.gather(*(start_one(i) for i in range(len(self.shards))))
+
+    async def reconnect(self, i):
+        """关闭第 i 条连接并重连、重新订阅，失败时按抖动退避重试"""
+        self.reconnect_count += 1
+        ws = self.conns[i]
+        self.conns[i] = None
+        if ws is not None:
+            try:
+                await self._close(ws)
+            except Exception as e:
+                logger.warning(f"close OKX public ws #{i} failed: {e}")
+        if self.on_reset:
+            self.on_reset(self.shards[i])
+        attempt = 0
+        while True:
+            try:
+                await self._connect(i)
+                return
+            except Exception as e:
+                delay = min(RECONNECT_MAX_SEC, RECONNECT_BASE_SEC * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"reconnect OKX public ws #{i} failed: {e}, retry in {delay:.1f}s")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def resubscribe(self, inst_id, channel):
+        """重新订阅单个合约的某个频道（如 books 缺口后请求新快照）"""
+        i = self.inst_shard[inst_id]
+        ws = self.conns[i]
+        if ws is None:
+            return
+        args = self._args([inst_id], (channel,))
+        await ws.unsubscribe(args, callback=self.callbacks[i])
+        await ws.subscribe(args, callback=self.callbacks[i])
+
+    def age_ms(self, inst_id, channel):
+        """合约某频道距最后一次推送的时间（毫秒），未订阅时返回 None"""
+        ts = self.last_msg_ms.get((inst_id, channel))
+        return None if ts is None else self.clock() - ts
+
+    def is_stale(self, inst_id):
+        """合约行情是否失效：所在连接未建立，或 books 停推超过 BOOK_STALL_MS"""
+        if self.conns[self.inst_shard[inst_id]] is None:
+            return True
+        age = self.age_ms(inst_id, "books")
+        return age is None or age > BOOK_STALL_MS
+
+    async def _heartbeat(self, i):
+        """连接空闲时发送 ping，服务端回 pong，用于区分行情清淡与连接假死"""
+        ws = self.conns[i]
+        if ws is None or ws.websocket is None:
+            return
+        try:
+            await ws.websocket.send("ping")
+        except Exception as e:
+            logger.warning(f"ping OKX public ws #{i} failed: {e}")
+
+    async def _check_books(self, i, now):
+        """连接正常但单合约 books 停推时，作废该合约订单簿并重新订阅以获取新快照"""
+        for inst in self.shards[i]:
+            age = now - self.last_msg_ms.get((inst, "books"), now)
+            if age <= BOOK_STALL_MS or now - self.resync_ms.get(inst, 0) <= BOOK_STALL_MS:
+                continue
+            self.stall_count += 1
+            self.resync_ms[inst] = now
+            logger.warning(f"{inst} books stalled for {age}ms, resubscribing")
+            if self.on_reset:
+                self.on_reset([inst])
+            try:
+                await self.resubscribe(inst, "books")
+            except Exception as e:
+                logger.warning(f"resubscribe {inst} books failed: {e}")
+
+    async def supervise(self):
+        """
+        巡检连接：底层 socket 关闭（连接断开）或长时间无任何帧（假死）时立即重连，
+        空闲连接发送心跳，单合约 books 停推时重新订阅
+        重连在各连接独立的后台任务中退避重试，不阻塞其他连接的巡检
+        """
+        try:
+            while True:
+                now = self.clock()
+                for i, task in enumerate(self.tasks):
+                    pending = self.reconnecting[i]
+                    if pending is not None and not pending.done():
+                        continue
+                    if task is None or task.done():
+                        err = task.exception() if task is not None and not task.cancelled() else None
+                        logger.warning(f"OKX public ws #{i} disconnected ({err}), reconnecting")
+                        self.reconnecting[i] = asyncio.create_task(self.reconnect(i))
+                        continue
+                    idle = now - self.last_frame_ms[i]
+                    if idle > CONN_STALL_MS:
+                        self.stall_count += 1
+                        logger.warning(f"OKX public ws #{i} silent for {idle}ms, reconnecting")
+                        self.reconnecting[i] = asyncio.create_task(self.reconnect(i))
+                        continue
+                    if idle > HEARTBEAT_SEC * 1000:
+                        await self._heartbeat(i)
+                    await self._check_books(i, now)
+                await asyncio.sleep(SUPERVISE_INTERVAL_SEC)
+        finally:
+            for pending in self.reconnecting:
+                if pending is not None:
+                    pending.cancel()
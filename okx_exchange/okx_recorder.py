@@ -0,0 +1,77 @@
+import gzip
+import queue
+import threading
+import time
+
+from utils.logging_setup import setup_logger
+
+logger = setup_logger("okx_recorder")
+
+
+# -----------------------------
+# 录制：原始 books / trades 帧 + 本地接收时间
+# -----------------------------
+class FrameRecorder:
+    """
+    将原始 WebSocket 帧追加写入 gzip 文件，每行 "接收时间毫秒\t原始帧"
+    - record 在 WebSocket 回调中调用，只记下接收时间并入队；解码、压缩、刷盘都在后台线程完成
+    - 以追加模式打开，多次录制会形成多成员 gzip，读取时自动拼接
+    """
+
+    def __init__(self, path, flush_every=1000):
+        """
+        :param path: 录制文件路径（建议 .gz 后缀）
+        :param flush_every: 每写入多少帧刷新一次
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.count = 0
+        self._fp = gzip.open(path, "at", encoding="utf-8")
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer, name="frame-recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, raw, recv_ms=None):
+        self._queue.put((recv_ms if recv_ms is not None else int(time.time() * 1000), raw))
+        self.count += 1
+
+    def pending(self):
+        """已入队但后台线程尚未写出的帧数"""
+        return self._queue.qsize()
+
+    def close(self):
+        """写出剩余帧并等待后台线程结束"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _writer(self):
+        fp = self._fp
+        written = 0
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                recv_ms, raw = item
+                if isinstance(raw, bytes):
+                    raw = raw.decode("utf-8")
+                try:
+                    fp.write(f"{recv_ms}\t{raw}\n")
+                except Exception as e:
+                    logger.error(f"record frame to {self.path} failed: {e}")
+                    continue
+                written += 1
+                if written >= self.flush_every:
+                    written = 0
+                    fp.flush()
+        finally:
+            fp.close()
+
+
+def read_frames(path):
+    """逐帧读取录制文件，返回 (接收时间毫秒, 原始帧)"""
+    with gzip.open(path, "rt", encoding="utf-8") as fp:
+        for line in fp:
+            ts, _, raw = line.rstrip("\n").partition("\t")
+            if raw:
+                yield int(ts), raw
@@ -0,0 +1,100 @@
+import argparse
+import json
+import time
+
+from okx_exchange.okx_decoder import loads
+from okx_exchange.okx_orderbook_trend_bot import SymbolContext, handle_message, recompute_and_decide, \
+    RECALC_THROTTLE_MS
+from okx_exchange.okx_recorder import read_frames
+
+
+# -----------------------------
+# 回放：虚拟时钟驱动 SymbolContext
+# -----------------------------
+class VirtualClock:
+    """可注入 SymbolContext 的虚拟毫秒时钟"""
+
+    def __init__(self, start_ms=0):
+        self.now = start_ms
+
+    def __call__(self):
+        return self.now
+
+
+class Replayer:
+    """
+    按录制顺序将帧送入 SymbolContext，时间由虚拟时钟推进
+    - speed 为 None 时尽可能快地回放；否则按 speed 倍速休眠模拟真实时间间隔
+    - 每个合约有新数据且距上次计算超过 RECALC_THROTTLE_MS（虚拟时间）时计算一次信号
+    """
+
+    def __init__(self, path, symbols=None, speed=None):
+        """
+        :param path: 录制文件路径
+        :param symbols: 只回放这些合约，默认全部
+        :param speed: 回放倍速，None 表示不限速
+        """
+        self.path = path
+        self.symbols = set(symbols) if symbols else None
+        self.speed = speed
+        self.clock = VirtualClock()
+        self.contexts = {}
+        self.results = []  # (虚拟时间, 合约, scores, action)
+        self.frames = 0
+
+    def _context(self, inst_id):
+        ctx = self.contexts.get(inst_id)
+        if ctx is None:
+            ctx = self.contexts[inst_id] = SymbolContext(inst_id, clock=self.clock)
+        return ctx
+
+    def run(self):
+        prev_ts = None
+        for ts, raw in read_frames(self.path):
+            if self.speed and prev_ts is not None and ts > prev_ts:
+                time.sleep((ts - prev_ts) / 1000 / self.speed)
+            prev_ts = ts
+            self.clock.now = ts
+            try:
+                msg = loads(raw)
+            except Exception:
+                continue
+            arg = msg.get("arg")
+            if not arg or "event" in msg:
+                continue
+            inst_id = arg.get("instId")
+            if self.symbols is not None and inst_id not in self.symbols:
+                continue
+            ctx = self._context(inst_id)
+            handle_message(ctx, msg)
+            self.frames += 1
+            if ctx.dirty and ts - ctx.last_calc_ms >= RECALC_THROTTLE_MS:
+                ctx.dirty = False
+                scores, action = recompute_and_decide(ctx, ts)
+                if scores:
+                    self.results.append((ts, inst_id, scores, action))
+        return self.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制的 OKX books/trades 帧")
+    parser.add_argument("path", help="录制文件路径")
+    parser.add_argument("--symbols", nargs="*", help="只回放指定合约")
+    parser.add_argument("--speed", type=float, default=None, help="回放倍速，不填则尽可能快")
+    parser.add_argument("--out", help="将信号结果写入 JSON 文件，便于比对优化前后输出")
+    args = parser.parse_args()
+
+    replayer = Replayer(args.path, args.symbols, args.speed)
+    start = time.perf_counter()
+    results = replayer.run()
+    cost = time.perf_counter() - start
+    print(f"replayed {replayer.frames} frames, {len(results)} scores in {cost:.2f}s")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fp:
+            json.dump([{"ts": ts, "symbol": sym, "action": action,
+                        "scores": {k: float(v) for k, v in scores.items()}}
+                       for ts, sym, scores, action in results], fp)
+
+
+if __name__ == "__main__":
+    main()
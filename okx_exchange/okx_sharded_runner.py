@@ -0,0 +1,183 @@
+import asyncio
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from okx_exchange.okx_bootstrap import bootstrap
+from okx_exchange.okx_orderbook_trend_bot import (SymbolContext, handle_message, run_symbol, WS_URL,
+                                                  WS_POOL_SIZE, WARM_START, SIGNAL_STORE_DIR)
+from okx_exchange.okx_public_feed import OkxPublicFeed
+from okx_exchange.okx_signal_store import ACTIONS, ACTION_CODES, SignalStore
+from okx_exchange.okx_trend_trade_strategy_bot import TREND_SYMBOL_LIST
+from utils.logging_setup import reopen_log_files, setup_logger, stop_listener
+
+# -----------------------------
+# 配置参数区
+# -----------------------------
+SHARD_PROCESSES = max(1, min(len(TREND_SYMBOL_LIST), mp.cpu_count()))  # 进程数
+COORDINATOR_INTERVAL_SEC = 1.0  # 协调进程读取间隔（秒）
+
+# 协调进程日志：每轮逐合约输出一行，不能使用机器人按调用位置限流的 logger
+logger = setup_logger("okx_sharded_runner")
+
+# 共享内存中每个合约一条定长记录
+# version 为 seqlock 版本号：写入前后各 +1，奇数表示正在写入
+SCORE_DTYPE = np.dtype([
+    ("version", np.uint64),
+    ("ts", np.int64),
+    ("final", np.int32),
+    ("gate", np.int32),
+    ("position_bias", np.int32),
+    ("action", np.int32),
+    ("trend", np.float64),
+    ("orderbook", np.float64),
+    ("trade", np.float64),
+    ("depth", np.float64),
+    ("edge_bps", np.float64),
+])
+
+
+class SharedScoreTable:
+    """
+    共享内存信号表，每个合约占一条定长记录
+    - 单写者（合约所属的分片进程）/ 多读者，使用 seqlock 保证读取一致性，无需加锁和序列化
+    """
+
+    def __init__(self, symbols, name=None, create=False):
+        """
+        :param symbols: 合约列表，下标即记录槽位
+        :param name: 共享内存名称，create=False 时必填
+        :param create: 是否新建共享内存
+        """
+        self.symbols = list(symbols)
+        self.slots = {sym: i for i, sym in enumerate(self.symbols)}
+        size = SCORE_DTYPE.itemsize * len(self.symbols)
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.table = np.ndarray((len(self.symbols),), dtype=SCORE_DTYPE, buffer=self.shm.buf)
+        if create:
+            self.table[:] = np.zeros(len(self.symbols), dtype=SCORE_DTYPE)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def publish(self, symbol, ts, scores, action, position_bias):
+        """写入一个合约的最新信号（仅由该合约所属进程调用）"""
+        rec = self.table[self.slots[symbol]:self.slots[symbol] + 1]
+        version = int(rec["version"][0])
+        rec["version"] = version + 1
+        rec["ts"] = ts
+        rec["final"] = scores["final"]
+        rec["gate"] = scores["gate"]
+        rec["position_bias"] = position_bias
+        rec["action"] = ACTION_CODES.get(action, 0)
+        rec["trend"] = scores["trend"]
+        rec["orderbook"] = scores["orderbook"]
+        rec["trade"] = scores["trade"]
+        rec["depth"] = scores["depth"]
+        rec["edge_bps"] = scores["edge_bps"]
+        rec["version"] = version + 2
+
+    def read(self, symbol, retries=100):
+        """
+        读取一个合约的最新信号
+        :return: numpy 记录副本；尚未写入或多次重试仍在写入时返回 None
+        """
+        i = self.slots[symbol]
+        for _ in range(retries):
+            v1 = int(self.table["version"][i])
+            if v1 % 2:
+                continue
+            rec = self.table[i].copy()
+            if int(self.table["version"][i]) == v1:
+                return rec if v1 else None
+        return None
+
+    def close(self, unlink=False):
+        del self.table
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+async def run_shard(symbols, table):
+    """分片进程主逻辑：自建连接订阅分配到的合约，计算结果写入共享内存表"""
+    contexts = {sym: SymbolContext(sym) for sym in symbols}
+    if WARM_START:
+        await bootstrap(contexts.values())
+
+    def route(inst_id, msg):
+        ctx = contexts.get(inst_id)
+        if ctx is not None:
+            handle_message(ctx, msg)
+
+    def reset(inst_ids):
+        for inst_id in inst_ids:
+            contexts[inst_id].reset_book()
+
+    def on_result(ctx, scores, action):
+        table.publish(ctx.symbol, ctx.last_calc_ms, scores, action, ctx.position_bias)
+
+    # 各分片只写自己合约的分区目录，可共用同一存储根目录
+    store = SignalStore(SIGNAL_STORE_DIR) if SIGNAL_STORE_DIR else None
+    for ctx in contexts.values():
+        ctx.signal_sink = store
+    feed = OkxPublicFeed(WS_URL, symbols, route, pool_size=WS_POOL_SIZE, on_reset=reset)
+    await feed.start()
+    tasks = [asyncio.create_task(run_symbol(feed, ctx, on_result=on_result)) for ctx in contexts.values()]
+    tasks.append(asyncio.create_task(feed.supervise()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        if store is not None:
+            store.close()
+
+
+def shard_main(symbols, all_symbols, table_name):
+    """分片进程入口"""
+    # fork 继承了父进程的文件 handler，改写到各分片自己的日志文件，避免多进程各自切分同一文件
+    reopen_log_files(mp.current_process().name)
+    table = SharedScoreTable(all_symbols, name=table_name)
+    try:
+        asyncio.run(run_shard(symbols, table))
+    finally:
+        table.close()
+        stop_listener()
+
+
+def main(symbols=None, processes=SHARD_PROCESSES):
+    """
+    协调进程：创建共享内存表，按轮转方式把合约分配到各分片进程，并定期读取最新信号
+    """
+    symbols = list(symbols or TREND_SYMBOL_LIST)
+    processes = max(1, min(processes, len(symbols)))
+    table = SharedScoreTable(symbols, create=True)
+    workers = []
+    try:
+        for i in range(processes):
+            shard = symbols[i::processes]
+            p = mp.Process(target=shard_main, args=(shard, symbols, table.name), name=f"okx-shard-{i}", daemon=True)
+            p.start()
+            workers.append(p)
+            logger.info(f"shard #{i} pid={p.pid} symbols={shard}")
+
+        while all(p.is_alive() for p in workers):
+            for sym in symbols:
+                rec = table.read(sym)
+                if rec is None:
+                    continue
+                logger.info(f"[coordinator] {sym} final={int(rec['final'])} gate={int(rec['gate'])} "
+                            f"bias={int(rec['position_bias'])} action={ACTIONS[int(rec['action'])]} "
+                            f"age={int(time.time() * 1000) - int(rec['ts'])}ms")
+            time.sleep(COORDINATOR_INTERVAL_SEC)
+        logger.error("shard process exited, stopping coordinator")
+    finally:
+        for p in workers:
+            p.terminate()
+        table.close(unlink=True)
+
+
+if __name__ == "__main__":
+    main()
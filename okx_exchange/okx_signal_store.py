@@ -0,0 +1,160 @@
+import datetime
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+from utils.logging_setup import setup_logger
+
+# 信号记录列：每次有效计算一行
+SIGNAL_DTYPE = np.dtype([
+    ("ts", np.int64),
+    ("final", np.int32),
+    ("gate", np.int8),
+    ("action", np.int8),
+    ("position_bias", np.int8),
+    ("sweep", np.int8),
+    ("trend", np.float64),
+    ("orderbook", np.float64),
+    ("trade", np.float64),
+    ("obi", np.float64),
+    ("tfi", np.float64),
+    ("uptick", np.float64),
+    ("ofi", np.float64),
+    ("refill_bid", np.float64),
+    ("refill_ask", np.float64),
+    ("vol_spike", np.float64),
+    ("vol_bps", np.float64),
+    ("ema1", np.float64),
+    ("ema2", np.float64),
+    ("depth", np.float64),
+    ("edge_bps", np.float64),
+    ("median_rest_ms", np.float64),
+    ("flicker_rate", np.float64),
+])
+
+ACTIONS = ["HOLD", "ENTER_LONG", "EXIT_LONG", "ENTER_SHORT", "EXIT_SHORT"]
+ACTION_CODES = {a: i for i, a in enumerate(ACTIONS)}
+DAY_MS = 86_400_000
+SCHEMA_FILE = "_schema.json"
+
+logger = setup_logger("okx_signal_store")
+
+
+def _nan(x):
+    return np.nan if x is None else x
+
+
+def _day(day_index):
+    return (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day_index))).isoformat()
+
+
+class SignalStore:
+    """
+    列式信号存储，按 <root>/<合约>/<UTC 日期>/<列名>.bin 分区
+    - record 只把一行元组追加到该合约的内存批次，不做字符串格式化和文件 I/O
+    - 批次写满或跨度超过 flush_interval_ms 后交给后台线程，转为结构化数组后按列追加原始小端二进制，
+      跨日的批次按日期拆分写入
+    - 每个分区目录保存一份 _schema.json，load_day 据此以 np.memmap 只读映射各列
+    """
+
+    def __init__(self, root, batch_size=1024, flush_interval_ms=60_000):
+        """
+        :param root: 存储根目录
+        :param batch_size: 每个合约内存批次行数，写满即落盘
+        :param flush_interval_ms: 批次首尾时间跨度超过该值即落盘，避免低频合约长时间不写
+        """
+        self.root = root
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.batches = {}  # 合约 -> [行元组列表, 首行时间]
+        self.count = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer, name="signal-store", daemon=True)
+        self._thread.start()
+
+    def record(self, symbol, rec, scores, action, position_bias):
+        """
+        追加一条信号
+        :param rec: SymbolContext.signals 中的特征记录
+        :param scores: compute_scores 返回的分数
+        """
+        ts = rec["timestamp"]
+        batch = self.batches.get(symbol)
+        if batch is None:
+            batch = self.batches[symbol] = [[], ts]
+        rows = batch[0]
+        rows.append((ts, scores["final"], scores["gate"], ACTION_CODES.get(action, 0), position_bias,
+                     rec["sweep"], scores["trend"], scores["orderbook"], scores["trade"], rec["obi"], rec["tfi"],
+                     rec["uptick"], rec["ofi"], rec["refill_bid"], rec["refill_ask"], rec["vol_spike"],
+                     rec["vol_bps"], _nan(rec["ema1"]), _nan(rec["ema2"]), scores["depth"], scores["edge_bps"],
+                     _nan(rec["median_rest_ms"]), rec["flicker_rate"]))
+        self.count += 1
+        if len(rows) >= self.batch_size or ts - batch[1] >= self.flush_interval_ms:
+            self._submit(symbol)
+
+    def _submit(self, symbol):
+        rows = self.batches.pop(symbol)[0]
+        if rows:
+            self._queue.put((symbol, rows))
+
+    def pending(self):
+        """已提交但后台线程尚未写出的批次数"""
+        return self._queue.qsize()
+
+    def flush(self):
+        """把所有未写满的批次交给后台线程"""
+        for symbol in list(self.batches):
+            self._submit(symbol)
+
+    def close(self):
+        """写出剩余数据并等待后台线程结束"""
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            symbol, rows = item
+            try:
+                rows = np.array(rows, dtype=SIGNAL_DTYPE)
+                days = rows["ts"] // DAY_MS
+                for d in np.unique(days):
+                    self._append(symbol, _day(d), rows[days == d])
+            except Exception as e:
+                logger.error(f"write {symbol} signals failed: {e}")
+
+    def _append(self, symbol, day, rows):
+        path = os.path.join(self.root, symbol, day)
+        os.makedirs(path, exist_ok=True)
+        schema = os.path.join(path, SCHEMA_FILE)
+        if not os.path.exists(schema):
+            with open(schema, "w", encoding="utf-8") as fp:
+                json.dump({name: SIGNAL_DTYPE[name].str for name in SIGNAL_DTYPE.names}, fp)
+        for name in SIGNAL_DTYPE.names:
+            with open(os.path.join(path, name + ".bin"), "ab") as fp:
+                fp.write(np.ascontiguousarray(rows[name]).tobytes())
+
+
+def load_day(root, symbol, day):
+    """
+    以只读内存映射加载一个合约一天的信号
+    :param day: UTC 日期，"YYYY-MM-DD" 或 datetime.date
+    :return: {列名: np.memmap}，行数以最短的列为准（写入中途的列可能多出部分行）；无数据时返回 {}
+    """
+    path = os.path.join(root, symbol, str(day))
+    schema = os.path.join(path, SCHEMA_FILE)
+    if not os.path.exists(schema):
+        return {}
+    with open(schema, encoding="utf-8") as fp:
+        dtypes = {name: np.dtype(s) for name, s in json.load(fp).items()}
+    n = min(os.path.getsize(os.path.join(path, name + ".bin")) // dt.itemsize for name, dt in dtypes.items())
+    if not n:
+        return {}
+    return {name: np.memmap(os.path.join(path, name + ".bin"), dtype=dt, mode="r", shape=(n,))
+            for name, dt in dtypes.items()}
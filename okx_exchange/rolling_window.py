@@ -0,0 +1,74 @@
+import numpy as np
+
+
+class RollingWindowSum:
+    """
+    基于 RingBuffer 的时间窗口滚动求和，同时维护多列数值的窗口累计
+    - 记录本身只存于环形缓冲区，这里只保存窗口起点的绝对序号与累计值
+    - add 时累加；淘汰时对过期片段做一次向量化求和并扣减，读取为 O(1)（淘汰为均摊 O(1)）
+    - 每淘汰 recompute_every 条后对窗口片段精确重算一次，消除浮点累计误差
+    """
+
+    def __init__(self, buffer, window_ms, value_fn, recompute_every=10_000, ts_column="ts"):
+        """
+        :param buffer: 数据所在的 RingBuffer，时间列需单调不减
+        :param window_ms: 窗口长度（毫秒）
+        :param value_fn: rows -> 各列合计，作用于 RingBuffer 视图，需与 add 的参数一一对应
+        :param recompute_every: 淘汰多少条后重算一次窗口和
+        :param ts_column: 时间列名
+        """
+        self.buffer = buffer
+        self.window_ms = window_ms
+        self.value_fn = value_fn
+        self.recompute_every = recompute_every
+        self.ts_column = ts_column
+        self.start_seq = buffer.total  # 窗口内最早记录的绝对序号
+        self.sums = [0.0] * len(value_fn(buffer.last(0)))
+        self._evicted = 0
+
+    def add(self, *values):
+        """缓冲区追加一行后调用，累加该行对应的数值"""
+        sums = self.sums
+        for i, v in enumerate(values):
+            sums[i] += v
+
+    def evict(self, now):
+        """淘汰 now - window_ms 之前的记录"""
+        buffer = self.buffer
+        if self.start_seq < buffer.first_seq():
+            # 窗口内的数据已被环形缓冲区覆盖，只能基于现存数据重算
+            self.start_seq = buffer.first_seq()
+            self._recompute(now)
+            return
+        rows = buffer.since_seq(self.start_seq)
+        k = int(np.searchsorted(rows[self.ts_column], now - self.window_ms, side="left"))
+        if not k:
+            return
+        self.start_seq += k
+        self._evicted += k
+        if self._evicted >= self.recompute_every or k == len(rows):
+            self._recompute(now)
+            return
+        sums = self.sums
+        for i, v in enumerate(self.value_fn(rows[:k])):
+            sums[i] -= v
+
+    def _recompute(self, now):
+        rows = self.buffer.since_seq(self.start_seq)
+        k = int(np.searchsorted(rows[self.ts_column], now - self.window_ms, side="left"))
+        self.start_seq += k
+        self._evicted = 0
+        self.sums = [float(v) for v in self.value_fn(rows[k:])]
+
+    def get(self, now):
+        """返回窗口内各列的累计值"""
+        self.evict(now)
+        return self.sums
+
+    def rows(self, now):
+        """返回窗口内记录的零拷贝视图"""
+        self.evict(now)
+        return self.buffer.since_seq(self.start_seq)
+
+    def __len__(self):
+        return self.buffer.total - self.start_seq
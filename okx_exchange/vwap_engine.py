@@ -0,0 +1,135 @@
+import numpy as np
+
+SESSION_MS = 86_400_000  # UTC 交易日
+
+
+class RollingVwap:
+    """
+    固定时间窗口的分桶 VWAP
+    - 每个桶累计 Σ(价格×数量)、Σ数量，窗口合计随桶进出增减，更新与查询均为 O(1)
+    - 每滚动一整轮按桶数组重算合计，消除长时间运行的浮点累计误差
+    """
+
+    def __init__(self, window_ms, bucket_ms=1000):
+        """
+        :param window_ms: 窗口长度（毫秒）
+        :param bucket_ms: 分桶间隔（毫秒），决定窗口边界精度
+        """
+        self.bucket_ms = bucket_ms
+        self.size = max(1, window_ms // bucket_ms)
+        self.num = np.zeros(self.size)  # 桶内 Σ(价格×数量)，下标 b % size
+        self.den = np.zeros(self.size)  # 桶内 Σ数量
+        self.sum_num = 0.0
+        self.sum_den = 0.0
+        self.cur_bucket = None
+        self._since_recompute = 0
+
+    def _advance(self, b):
+        """推进到桶 b，清空滑出窗口的桶"""
+        if self.cur_bucket is None:
+            self.cur_bucket = b
+            return
+        if b <= self.cur_bucket:
+            return
+        if b - self.cur_bucket >= self.size:
+            self.num[:] = 0.0
+            self.den[:] = 0.0
+            self.sum_num = self.sum_den = 0.0
+            self._since_recompute = 0
+        else:
+            for i in range(self.cur_bucket + 1, b + 1):
+                j = i % self.size
+                self.sum_num -= self.num[j]
+                self.sum_den -= self.den[j]
+                self.num[j] = 0.0
+                self.den[j] = 0.0
+            self._since_recompute += b - self.cur_bucket
+            if self._since_recompute >= self.size:
+                self._since_recompute = 0
+                self.sum_num = float(self.num.sum())
+                self.sum_den = float(self.den.sum())
+        self.cur_bucket = b
+
+    def add(self, ts, price, size):
+        """写入一笔成交"""
+        b = ts // self.bucket_ms
+        if self.cur_bucket is not None and b <= self.cur_bucket - self.size:
+            # 已滑出窗口的迟到成交，忽略
+            return
+        self._advance(b)
+        j = b % self.size
+        self.num[j] += price * size
+        self.den[j] += size
+        self.sum_num += price * size
+        self.sum_den += size
+
+    def get(self, now):
+        """返回截至 now 的窗口 VWAP，窗口内无成交时返回 None"""
+        self._advance(now // self.bucket_ms)
+        return float(self.sum_num / self.sum_den) if self.sum_den > 0 else None
+
+
+class SessionVwap:
+    """
+    交易时段 VWAP，每到时段边界（默认 UTC 00:00）清零重新累计
+    """
+
+    def __init__(self, session_ms=SESSION_MS, offset_ms=0):
+        """
+        :param session_ms: 时段长度（毫秒）
+        :param offset_ms: 时段起点相对 UTC 00:00 的偏移（毫秒）
+        """
+        self.session_ms = session_ms
+        self.offset_ms = offset_ms
+        self.session = None
+        self.sum_num = 0.0
+        self.sum_den = 0.0
+
+    def _roll(self, ts):
+        """ts 进入新时段时清零；返回 ts 是否属于当前或更新的时段"""
+        s = (ts - self.offset_ms) // self.session_ms
+        if self.session is None or s > self.session:
+            self.session = s
+            self.sum_num = self.sum_den = 0.0
+        return s == self.session
+
+    def add(self, ts, price, size):
+        if self._roll(ts):
+            self.sum_num += price * size
+            self.sum_den += size
+
+    def get(self, now):
+        self._roll(now)
+        return float(self.sum_num / self.sum_den) if self.sum_den > 0 else None
+
+
+class VwapEngine:
+    """
+    多窗口 VWAP：一笔成交同时写入所有窗口，按名称查询
+    """
+
+    def __init__(self, windows_ms, bucket_ms=1000, session=True):
+        """
+        :param windows_ms: {名称: 窗口长度毫秒}，如 {"5m": 300_000, "1h": 3_600_000}
+        :param bucket_ms: 滚动窗口分桶间隔（毫秒）
+        :param session: 是否同时维护 UTC 交易日 VWAP（名称 "session"）
+        """
+        self.windows = {name: RollingVwap(ms, bucket_ms) for name, ms in windows_ms.items()}
+        if session:
+            self.windows["session"] = SessionVwap()
+
+    def add(self, ts, price, size):
+        for w in self.windows.values():
+            w.add(ts, price, size)
+
+    def get(self, name, now):
+        """
+        :param name: 窗口名称
+        :param now: 当前时间（毫秒）
+        :return: VWAP，无成交时返回 None
+        """
+        return self.windows[name].get(now)
+
+    def snapshot(self, now):
+        """返回全部窗口的 VWAP {名称: 值}"""
+        return {name: w.get(now) for name, w in self.windows.items()}
@@ -0,0 +1,184 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from utils.logging_setup import setup_logger
+
+logger = setup_logger("latency", rate_limit_sec=10.0)
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    HDR 风格的对数线性直方图（单位：微秒）
+    - 小于 2^sub_bits 的值逐个计数，之后每个 2 的幂区间再细分 2^(sub_bits-1) 个桶，相对误差约 2^-(sub_bits-1)
+    - 桶数固定，记录为 O(1) 整数运算 + 一次计数自增，内存与样本量无关
+    - 单写者（所在事件循环线程）无锁写入；读取方（指标接口线程）复制计数后计算分位数，可能与写入相差几个样本
+    """
+
+    def __init__(self, max_us=60_000_000, sub_bits=7):
+        """
+        :param max_us: 最大可记录值（微秒），超出按最大值计
+        :param sub_bits: 精度位数
+        """
+        self.sub_bits = sub_bits
+        self.sub_count = 1 << sub_bits
+        self.half = self.sub_count >> 1
+        self.max_us = max_us
+        self.counts = np.zeros(self._index(max_us) + 1, dtype=np.int64)
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def _index(self, v):
+        if v < self.sub_count:
+            return v
+        e = v.bit_length() - self.sub_bits
+        return e * self.half + (v >> e)
+
+    def _upper(self, i):
+        """桶 i 的上界（含）"""
+        if i < self.sub_count:
+            return i
+        e = (i - self.sub_count) // self.half + 1
+        return ((i - e * self.half + 1) << e) - 1
+
+    def record(self, us):
+        v = min(max(int(us), 0), self.max_us)
+        self.counts[self._index(v)] += 1
+        self.total += 1
+        self.sum += v
+        if v > self.max:
+            self.max = v
+
+    def percentile(self, p, counts=None):
+        counts = self.counts.copy() if counts is None else counts
+        n = int(counts.sum())
+        if not n:
+            return None
+        i = int(np.searchsorted(np.cumsum(counts), max(1, int(np.ceil(n * p / 100.0)))))
+        return min(self._upper(i), self.max)
+
+    def snapshot(self):
+        counts = self.counts.copy()
+        n = int(counts.sum())
+        out = {"count": n, "max_us": self.max, "mean_us": (self.sum / self.total) if self.total else None}
+        for p in PERCENTILES:
+            out[f"p{p:g}_us"] = self.percentile(p, counts) if n else None
+        return out
+
+    def reset(self):
+        self.counts[:] = 0
+        self.total = self.sum = self.max = 0
+
+
+class Metrics:
+    """
+    延迟与吞吐指标注册表
+    - observe(key, stage, us)：按 (合约, 阶段) 记录延迟直方图
+    - incr(key, name)：计数器，快照中附带自启动以来的平均速率
+    - gauge(name, fn)：读取时才调用的瞬时值（队列深度等）
+    - check_age(key, age_ms, budget_ms)：交易所事件到决策的延迟超出预算时标记为过期信号
+    """
+
+    def __init__(self, stale_budget_ms=500):
+        """
+        :param stale_budget_ms: 交易所事件时间到决策时间的预算（毫秒）
+        """
+        self.stale_budget_ms = stale_budget_ms
+        self.histograms = {}  # (key, stage) -> LatencyHistogram
+        self.counters = {}  # (key, name) -> 计数
+        self.gauges = {}  # name -> fn
+        self.started = time.time()
+
+    def histogram(self, key, stage):
+        h = self.histograms.get((key, stage))
+        if h is None:
+            h = self.histograms[(key, stage)] = LatencyHistogram()
+        return h
+
+    def observe(self, key, stage, us):
+        self.histogram(key, stage).record(us)
+
+    def observe_ns(self, key, stage, ns):
+        self.histogram(key, stage).record(ns // 1000)
+
+    @contextmanager
+    def timed(self, key, stage):
+        """计时代码块，结果记入 (key, stage) 直方图"""
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.observe_ns(key, stage, time.perf_counter_ns() - t0)
+
+    def incr(self, key, name, n=1):
+        k = (key, name)
+        self.counters[k] = self.counters.get(k, 0) + n
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    def check_age(self, key, age_ms, budget_ms=None, stage="exchange_to_decision"):
+        """
+        记录交易所事件到决策的延迟
+        :param budget_ms: 延迟预算（毫秒），默认 stale_budget_ms
+        :return: 超出预算时返回 True，并计入 stale_signals
+        """
+        budget_ms = self.stale_budget_ms if budget_ms is None else budget_ms
+        self.observe(key, stage, age_ms * 1000)
+        if age_ms > budget_ms:
+            self.incr(key, "stale_signals")
+            # 落后或时钟偏差时每次决策都会超预算，以 INFO 记录使 logger 限流生效，总数见 stale_signals 计数
+            logger.info(f"[{key}] stale signal: {stage} {age_ms}ms > budget {budget_ms}ms",
+                        extra={"rate_key": key})
+            return True
+        return False
+
+    def snapshot(self):
+        elapsed = max(time.time() - self.started, 1e-9)
+        out = {"uptime_sec": elapsed, "latency": {}, "counters": {}, "gauges": {}}
+        for (key, stage), h in list(self.histograms.items()):
+            out["latency"].setdefault(key, {})[stage] = h.snapshot()
+        for (key, name), n in list(self.counters.items()):
+            out["counters"].setdefault(key, {})[name] = {"total": n, "rate_per_sec": n / elapsed}
+        for name, fn in list(self.gauges.items()):
+            try:
+                out["gauges"][name] = fn()
+            except Exception as e:
+                out["gauges"][name] = f"error: {e}"
+        return out
+
+
+# 进程内共享的指标注册表，各机器人直接导入使用
+metrics = Metrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = json.dumps(metrics.snapshot(), default=float).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """在后台守护线程启动本地指标接口：GET http://host:port/metrics 返回 JSON"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
@@ -1,6 +1,10 @@
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
+import threading
+import time
 
 # 创建日志目录
 LOG_DIR = "logs"
@@ -9,25 +13,250 @@ os.makedirs(LOG_DIR, exist_ok=True)
 # okx开立交易macd指标文件路径
 okx_trade_macd_file = os.path.join(LOG_DIR, "okx_trade_macd.log")
 
+LOG_FORMAT = "%(asctime)s [%(levelname)s] [%(threadName)s] [%(name)s] %(message)s"
+LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
+LOG_MAX_BYTES = 300 * 1024 * 1024
+LOG_BACKUP_COUNT = 7
+FLUSH_BATCH = 512  # 后台线程每批最多写入的记录数，每批结束统一 flush 一次
+
+
+# -----------------------------
+# 后台写日志：业务线程只入队，格式化、写盘、切分文件都在监听线程完成
+# -----------------------------
+class _BatchFlushMixin:
+    """写入时不逐条 flush，由监听线程每批结束后调用 flush_batch"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class _StreamHandler(_BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class _RotatingFileHandler(_BatchFlushMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class _TimedRotatingFileHandler(_BatchFlushMixin, logging.handlers.TimedRotatingFileHandler):
+    pass
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    入队时不格式化消息：默认 prepare 会在调用线程里拼接消息和异常堆栈，
+    同进程内记录对象可直接交给监听线程，格式化推迟到后台完成
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _BatchQueueListener(logging.handlers.QueueListener):
+    """
+    按记录所属 logger 分发到各自的 handler，并附带根 handler（控制台 + app.log），
+    每次取出一批记录写完后统一 flush
+    """
+
+    def __init__(self, q):
+        super().__init__(q, respect_handler_level=True)
+        self.routes = {}  # logger 名称 -> 专属 handler 列表
+        self.root_handlers = []
+
+    def targets(self, name):
+        return self.routes.get(name, ()), self.root_handlers
+
+    def handle(self, record):
+        for handlers in self.targets(record.name):
+            for h in handlers:
+                if record.levelno >= h.level:
+                    h.handle(record)
+
+    def _flush(self):
+        for handlers in (self.root_handlers, *list(self.routes.values())):
+            for h in handlers:
+                try:
+                    h.flush_batch()
+                except Exception:
+                    pass
+
+    def _monitor(self):
+        q = self.queue
+        while True:
+            batch = [q.get()]
+            while len(batch) < FLUSH_BATCH:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                    continue
+                self.handle(record)
+            self._flush()
+            if stop:
+                break
+
+
+_queue = queue.SimpleQueue()
+_listener = None
+_setup_lock = threading.Lock()
+_queue_handlers = []  # 全部入队 handler，fork 后改指向子进程的新队列
+
+
+def queue_size():
+    """后台写日志队列中尚未写出的记录数"""
+    return _queue.qsize()
+
+
+def _file_handler(cls, path, **kwargs):
+    """创建文件 handler 并记下构造参数，reopen_log_files 据此在子进程中换文件重建"""
+    h = cls(path, **kwargs)
+    h.reopen_args = (cls, kwargs)
+    return h
+
+
+def _formatter():
+    return logging.Formatter(fmt=LOG_FORMAT, datefmt=LOG_DATEFMT)
+
+
+def _new_queue_handler():
+    qh = _QueueHandler(_queue)
+    _queue_handlers.append(qh)
+    return qh
+
+
+def _attach(logger, handlers, rate_limit_sec=None):
+    """为 logger 注册后台 handler，logger 本身只挂一个入队 handler"""
+    for h in handlers:
+        h.setFormatter(_formatter())
+    _listener.routes[logger.name] = list(handlers)
+    qh = _new_queue_handler()
+    if rate_limit_sec:
+        qh.addFilter(RateLimitFilter(rate_limit_sec))
+    logger.addHandler(qh)
+    # 根 handler 已由监听线程附带写入，不再向上传播
+    logger.propagate = False
+
 
 def base_logger():
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(asctime)s [%(levelname)s] [%(threadName)s] [%(name)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=[
-            logging.StreamHandler(),
-            logging.handlers.RotatingFileHandler(os.path.join(LOG_DIR, "app.log"), maxBytes=300 * 1024 * 1024,
-                                                 backupCount=7,
-                                                 encoding="utf-8")
+    """只在首次调用时配置根 logger 并启动后台写日志线程"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        _listener = _BatchQueueListener(_queue)
+        _listener.root_handlers = [
+            _StreamHandler(),
+            _file_handler(_RotatingFileHandler, os.path.join(LOG_DIR, "app.log"), maxBytes=LOG_MAX_BYTES,
+                          backupCount=LOG_BACKUP_COUNT, encoding="utf-8"),
         ]
-    )
+        for h in _listener.root_handlers:
+            h.setFormatter(_formatter())
+        root = logging.getLogger()
+        root.setLevel(logging.DEBUG)
+        root.addHandler(_new_queue_handler())
+        _listener.start()
+        atexit.register(stop_listener)
+
+
+def stop_listener():
+    """写出队列中剩余的日志并停止后台线程；multiprocessing 子进程以 os._exit 退出不会执行 atexit，需在入口显式调用"""
+    with _setup_lock:
+        if _listener is not None and _listener._thread is not None:
+            _listener.stop()
+
+
+def _after_fork_in_child():
+    """
+    fork 出的子进程只继承调用线程，父进程的监听线程不存在：
+    换一个新队列并以相同的 handler 重新启动监听线程，否则子进程的日志只入队、永不写出
+    """
+    global _queue, _listener, _setup_lock
+    _setup_lock = threading.Lock()
+    if _listener is None:
+        return
+    old = _listener
+    _queue = queue.SimpleQueue()
+    _listener = _BatchQueueListener(_queue)
+    _listener.routes = old.routes
+    _listener.root_handlers = old.root_handlers
+    for qh in _queue_handlers:
+        qh.queue = _queue
+    _listener.start()
 
 
-def setup_logger(name: str = "app"):
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def reopen_log_files(tag):
+    """
+    fork 出的子进程调用：把全部文件 handler 换成写入 <原文件名>.<tag>.log 的新 handler
+    父子进程若共用同一文件，各自按大小/日期切分时会互相覆盖备份、写入已被改名的旧文件
+    :param tag: 文件名标记，如进程名
+    """
+    with _setup_lock:
+        if _listener is None:
+            return
+
+        def reopen(h):
+            args = getattr(h, "reopen_args", None)
+            if args is None:
+                return h
+            cls, kwargs = args
+            root, ext = os.path.splitext(h.baseFilename)
+            new = _file_handler(cls, f"{root}.{tag}{ext}", **kwargs)
+            new.setLevel(h.level)
+            new.setFormatter(h.formatter)
+            return new
+
+        # 整体替换列表与字典，监听线程读取时拿到的要么是旧的、要么是新的完整集合
+        _listener.root_handlers = [reopen(h) for h in _listener.root_handlers]
+        _listener.routes = {name: [reopen(h) for h in handlers] for name, handlers in _listener.routes.items()}
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    按调用位置限流：同一行代码的 INFO 及以下日志每 interval_sec 秒最多放行一条，
+    被丢弃的条数附在下一条放行的日志末尾；WARNING 及以上不限流
+    - 多个合约共用一个 logger 时，调用方传 extra={"rate_key": 合约} 使各合约分别限流
     """
-    创建并返回一个logger
+
+    def __init__(self, interval_sec=1.0):
+        super().__init__()
+        self.interval_sec = interval_sec
+        self.last = {}  # (文件, 行号, rate_key) -> [上次放行时间, 期间丢弃条数]
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        key = (record.pathname, record.lineno, getattr(record, "rate_key", None))
+        now = time.monotonic()
+        state = self.last.get(key)
+        if state is None:
+            self.last[key] = [now, 0]
+            return True
+        if now - state[0] < self.interval_sec:
+            state[1] += 1
+            return False
+        if state[1]:
+            record.msg = f"{record.msg} (suppressed {state[1]})"
+        state[0] = now
+        state[1] = 0
+        return True
+
+
+def setup_logger(name: str = "app", rate_limit_sec: float = None):
+    """
+    创建并返回一个logger，日志写入 logs/<name>.log，同时输出到控制台和 app.log
+    写盘在后台线程完成，调用方只入队
     :param name: 日志器名称（建议传入模块名：__name__）
+    :param rate_limit_sec: 热路径 logger 可设置按调用位置限流的间隔（秒），None 表示不限流
     """
     base_logger()
     logger = logging.getLogger(name)
@@ -37,29 +266,11 @@ def setup_logger(name: str = "app"):
     if logger.handlers:
         return logger
 
-    # 日志格式
-    formatter = logging.Formatter(
-        fmt="%(asctime)s [%(levelname)s] [%(threadName)s] [%(name)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-
-    # 控制台输出
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-
-    # 文件输出（按日期切分，每天一个文件，保留7天）
-    # 运行日志文件路径
-
+    # 文件输出（按大小切分，保留7个）
     log_file = os.path.join(LOG_DIR, name + ".log")
-    file_handler = logging.handlers.RotatingFileHandler(
-        log_file, maxBytes=300 * 1024 * 1024, backupCount=7, encoding="utf-8",
-    )
-    file_handler.setFormatter(formatter)
-
-    # 添加到logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-
+    file_handler = _file_handler(_RotatingFileHandler, log_file, maxBytes=LOG_MAX_BYTES,
+                                 backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    _attach(logger, [file_handler], rate_limit_sec)
     return logger
 
 
@@ -67,6 +278,7 @@ def setup_okx_macd_logger():
     """
     创建并返回一个专门用于记录okx macd指标的logger
     """
+    base_logger()
     logger = logging.getLogger("okx_macd")
     logger.setLevel(logging.DEBUG)
 
@@ -74,19 +286,10 @@ def setup_okx_macd_logger():
     if logger.handlers:
         return logger
 
-    # 日志格式
-    formatter = logging.Formatter(
-        fmt="%(asctime)s [%(levelname)s] [%(threadName)s] [%(name)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-
     # 文件输出（按日期切分，每天一个文件，保留30天）
-    file_handler = logging.handlers.TimedRotatingFileHandler(
-        okx_trade_macd_file, when="midnight", interval=1, backupCount=30, encoding="utf-8"
+    file_handler = _file_handler(
+        _TimedRotatingFileHandler, okx_trade_macd_file, when="midnight", interval=1, backupCount=30,
+        encoding="utf-8"
     )
-    file_handler.setFormatter(formatter)
-
-    # 添加到logger
-    logger.addHandler(file_handler)
-
+    _attach(logger, [file_handler])
     return logger
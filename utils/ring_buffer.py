@@ -0,0 +1,63 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    基于 NumPy 结构化数组的定长环形缓冲区
+    - 按列存储定长类型（如 int64 时间戳、float64 价格/数量、int8 方向），避免大量 Python 元组对象
+    - 底层数组长度为 2 * capacity，每行同时写入 i 与 i + capacity 两个位置，
+      因此任意"最近 k 条"都是一段连续内存，可直接返回零拷贝视图
+    """
+
+    def __init__(self, capacity, dtype):
+        """
+        :param capacity: 最大保存条数
+        :param dtype: 列定义，如 [("ts", np.int64), ("px", np.float64)]
+        """
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self._data = np.zeros(2 * capacity, dtype=self.dtype)
+        self._head = 0  # 下一条写入的位置
+        self.total = 0  # 累计写入条数，用作绝对序号
+
+    def append(self, *row):
+        """追加一行，字段顺序与 dtype 一致"""
+        i = self._head
+        self._data[i] = row
+        self._data[i + self.capacity] = row
+        self._head = i + 1 if i + 1 < self.capacity else 0
+        self.total += 1
+
+    def __len__(self):
+        return self.total if self.total < self.capacity else self.capacity
+
+    def last(self, k):
+        """返回最近 k 条记录（按写入顺序）的零拷贝视图"""
+        n = min(k, len(self))
+        end = self._head + self.capacity
+        return self._data[end - n:end]
+
+    def view(self):
+        """返回全部有效记录的零拷贝视图"""
+        return self.last(self.capacity)
+
+    def since_seq(self, seq):
+        """返回绝对序号 >= seq 的记录视图；更早的记录若已被覆盖则不包含在内"""
+        return self.last(self.total - seq)
+
+    def window(self, since, column="ts"):
+        """
+        返回 column 列 >= since 的记录视图，要求该列按写入顺序单调不减
+        :param since: 起始值（含）
+        :param column: 时间列名
+        """
+        v = self.view()
+        return v[np.searchsorted(v[column], since, side="left"):]
+
+    def first_seq(self):
+        """当前仍保存在缓冲区中的最早记录的绝对序号"""
+        return self.total - len(self)
+
+    def __getitem__(self, idx):
+        """按时间顺序下标访问，支持负下标"""
+        return self.view()[idx]